@@ -1,31 +1,202 @@
+import abc
+import argparse
 import asyncio
+import atexit
+import base64
+import bisect
+import contextvars
+import csv
+import heapq
+import cProfile
+import hashlib
+import io
+import itertools
 import logging
+import logging.handlers
 import json
+import multiprocessing
 import os
-from datetime import datetime, date
-from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import Command, CommandStart
+import pstats
+import queue
+import random
+import re
+import shutil
+import tempfile
+import time
+import tracemalloc
+import zlib
+from array import array
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, date, timedelta
+from typing import Any, Awaitable, Callable
+from aiogram import BaseMiddleware, Bot, Dispatcher, types, F
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.session.base import BaseSession
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramServerError
+)
+from aiogram.filters import Command, CommandObject, CommandStart, Filter
+from aiogram.types import Chat, File, MessageId, Update
 from aiogram.types import (
     Message, InlineKeyboardMarkup, InlineKeyboardButton, 
-    CallbackQuery, ReplyKeyboardMarkup, KeyboardButton
+    CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, BufferedInputFile
 )
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
 # Настройка логирования
-logging.basicConfig(level=logging.INFO)
+LOG_LEVEL = logging.INFO
+LOG_RATE_WINDOW = 60  # Окно ограничения повторяющихся записей (секунды)
+LOG_RATE_BURST = 5  # Сколько одинаковых записей пропускается за окно
+
+# Контекст текущего апдейта (update_id, user_id, handler) для структурных логов
+log_context = contextvars.ContextVar("log_context", default={})
+
+class ContextFilter(logging.Filter):
+    """Добавляет в запись контекст текущего апдейта"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in log_context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Ограничивает поток одинаковых предупреждений и ошибок (например, при отправке одному админу)"""
+    
+    def __init__(self, window: float = LOG_RATE_WINDOW, burst: int = LOG_RATE_BURST):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._counters = {}  # key -> [начало окна, пропущено, подавлено]
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        first_arg = record.args[0] if isinstance(record.args, tuple) and record.args else None
+        if not isinstance(first_arg, (int, str)):
+            first_arg = None
+        key = (record.levelno, record.msg, first_arg)
+        now = time.monotonic()
+        counter = self._counters.get(key)
+        if counter is None or now - counter[0] >= self.window:
+            if len(self._counters) > 10000:
+                self._counters.clear()
+            if counter is not None and counter[2]:
+                record.suppressed = counter[2]
+            self._counters[key] = [now, 1, 0]
+            return True
+        if counter[1] < self.burst:
+            counter[1] += 1
+            return True
+        counter[2] += 1
+        return False
+
+class JsonFormatter(logging.Formatter):
+    """Форматирование записи в одну строку JSON"""
+    
+    FIELDS = ("tenant", "update_id", "user_id", "handler", "latency_ms", "suppressed")
+    
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования в потоке event loop: сообщение собирается в фоне"""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Вывод логов через очередь и фоновый поток"""
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    queue_handler.addFilter(RateLimitFilter())
+    queue_handler.addFilter(ContextFilter())
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JsonFormatter())
+    
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.handlers[:] = [queue_handler]
+    
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Конфигурация
-BOT_TOKEN = "8507674114:AAFgjyi2r5MA5_L2BBqs5za0mxUN940Sk1Y"
-ADMIN_IDS = [8525676787, 5503605811]  # Замените на ID администраторов
+# Токен и админов можно задать переменными окружения BOT_TOKEN и ADMIN_IDS ("111,222")
+BOT_TOKEN = os.environ.get("BOT_TOKEN", "")
+ADMIN_IDS = [int(admin_id) for admin_id in os.environ.get("ADMIN_IDS", "").split(",") if admin_id.strip()]
+# Операторы сервиса (переменная OPERATOR_IDS, по умолчанию никого): только им доступны /profile и /memsnap,
+# потому что профилировщик и tracemalloc видят весь процесс, то есть данные всех ботов
+OPERATOR_IDS = frozenset(
+    int(operator_id) for operator_id in os.environ.get("OPERATOR_IDS", "").split(",") if operator_id.strip()
+)
 BLOCKED_FILE = "blocked_users.json"
 POSTS_LOG = "posts_log.json"
 USERS_LOG = "users_log.json"
+POST_QUEUE_DIR = "post_queue"  # Недоставленные посты, по файлу на пост
+POST_STATS_FILE = "post_stats"  # Префикс файлов колонок аналитики (post_stats.user_id и т.д.)
+ANALYTICS_DAYS = 30  # Период расширенной аналитики в панели
+BANNED_WORDS_FILE = "banned_words.json"
+HELD_POSTS_FILE = "held_posts.json"
+SCHEDULE_FILE = "publication_schedule.json"
+REPLY_INDEX_FILE = "reply_index.json"
+UPDATE_STATE_FILE = "update_state.json"  # Обработанные update_id: отметка и окно последних апдейтов
+UPDATE_DEDUP_WINDOW = 4096  # Сколько последних update_id помнить для отсева повторов
+REPLY_INDEX_SIZE = 10000  # Сколько сообщений админов помнить для ответа
+REPLY_INDEX_TTL = 30 * 24 * 3600  # Сколько помнить сообщение админа (секунды)
+REPLY_INDEX_SAVE_DELAY = 5  # Задержка сохранения индекса после изменений (секунды)
+NOTIFY_RATE = 10  # Фоновых уведомлений пользователям в секунду на одного бота
+CHANNEL_ID = None  # Канал для публикации одобренных постов (None - публикация выключена)
+PUBLISH_SLOTS = []  # Время публикаций, например ["09:00", "13:00", "19:00"]; пусто - по интервалу
+PUBLISH_SPACING = 3600  # Минимальный интервал между публикациями (секунды)
+PUBLISH_MAX_ATTEMPTS = 5  # Попыток публикации одного поста
+POST_WORKERS = 4  # Количество воркеров доставки постов
+POST_QUEUE_LIMIT = 100  # Порог очереди, после которого доставка считается задержанной
+POST_QUEUE_WAIT = 10  # Сколько придерживать сообщения пользователей при переполненной очереди (секунды)
+POST_RETRY_BASE = 2  # Базовая задержка повтора (секунды)
+POST_RETRY_MAX = 300  # Максимальная задержка повтора (секунды)
+UPDATE_CONCURRENCY = 16  # Сколько пользователей обрабатывается параллельно
+PROFILE_MAX_SECONDS = 300  # Максимальная длительность профилирования
+PROFILE_TOP = 40  # Количество строк в отчетах профилировщика
+TENANTS_FILE = os.environ.get("TENANTS_FILE", "tenants.json")  # Список ботов (если файл есть); изменения применяются на лету
+CONFIG_POLL_INTERVAL = 5  # Как часто проверять изменения TENANTS_FILE (секунды)
+TENANT_RATE_LIMIT = 25  # Запросов к Bot API в секунду на одного бота
+HTTP_POOL_LIMIT = 100  # Общий лимит соединений HTTP-сессии для всех ботов
+HTTP_KEEPALIVE = 60  # Сколько держать простаивающее соединение с Bot API (секунды)
+DEAD_CHATS_FILE = "dead_chats.json"  # Чаты, недоступные боту (бот заблокирован, аккаунт удален)
+DEAD_CHAT_PROBE_INTERVAL = 24 * 3600  # Как часто пропускать пробный запрос в недоступный чат
+CIRCUIT_FAILURES = 5  # Сбоев подряд, после которых запросы в чат приостанавливаются
+CIRCUIT_COOLDOWN = 60  # Пауза перед пробным запросом в чат с разомкнутой цепью (секунды)
+TRANSIENT_RETRIES = 3  # Повторов запроса при сетевой ошибке или ошибке сервера Telegram
+TRANSIENT_RETRY_BASE = 0.5  # Базовая задержка повтора (секунды)
+POLLING_TIMEOUT = 30  # Таймаут long polling во фронт-процессе (секунды)
+PRIMARY_SHARD = 0  # Воркер, который ведет расписание публикаций и единственный пишет общий список блокировок
+SHARD_QUERY_TIMEOUT = 5  # Сколько ждать ответа другого воркера на запрос данных (секунды)
+TRACE_MAX_BYTES = 50 * 1024 * 1024  # Размер файла трассы до ротации
+TRACE_BACKUPS = 10  # Сколько старых файлов трассы хранить
 
 # Инициализация
-bot = Bot(token=BOT_TOKEN)
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
@@ -34,7 +205,22 @@ class AdminStates(StatesGroup):
     waiting_for_unblock_user = State()
     waiting_for_block_user = State()
     waiting_for_block_reason = State()
+    waiting_for_block_duration = State()
     waiting_for_reply = State()
+    waiting_for_bulk_ids = State()
+
+# Учет записи файлов состояния (выводится в отчете replay)
+state_io_stats = {"writes": 0, "chars": 0}
+
+def write_json(filename: str, data):
+    """Запись JSON-файла состояния через временный файл"""
+    payload = json.dumps(data, ensure_ascii=False, indent=2)
+    tmp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp_filename, 'w', encoding='utf-8') as f:
+        f.write(payload)
+    os.replace(tmp_filename, filename)
+    state_io_stats["writes"] += 1
+    state_io_stats["chars"] += len(payload)
 
 # Менеджер блокировок
 class BlockManager:
@@ -42,6 +228,7 @@ class BlockManager:
         self.filename = filename
         self.blocked_users = self.load_blocked()
         self.unblock_log = []
+        self.on_block = None  # Вызывается с (user_id_str, данные) после блокировки
     
     def load_blocked(self) -> dict:
         """Загрузка списка заблокированных пользователей"""
@@ -52,13 +239,12 @@ class BlockManager:
     
     def save_blocked(self):
         """Сохранение списка заблокированных"""
-        with open(self.filename, 'w', encoding='utf-8') as f:
-            json.dump(self.blocked_users, f, ensure_ascii=False, indent=2)
+        write_json(self.filename, self.blocked_users)
     
     def block_user(self, user_id: int, username: str = "", 
                    first_name: str = "", last_name: str = "", 
-                   admin_id: int = None, reason: str = ""):
-        """Блокировка пользователя"""
+                   admin_id: int = None, reason: str = "", duration: int = None):
+        """Блокировка пользователя (duration - срок в секундах, None - навсегда)"""
         user_id_str = str(user_id)
         self.blocked_users[user_id_str] = {
             "username": username,
@@ -66,9 +252,12 @@ class BlockManager:
             "last_name": last_name,
             "blocked_at": datetime.now().isoformat(),
             "blocked_by": admin_id,
-            "reason": reason
+            "reason": reason,
+            "expires_at": (datetime.now() + timedelta(seconds=duration)).isoformat() if duration else None
         }
         self.save_blocked()
+        if self.on_block is not None:
+            self.on_block(user_id_str, self.blocked_users[user_id_str])
         # Логируем блокировку
         self.log_block_unblock(user_id, "block", admin_id)
     
@@ -83,6 +272,49 @@ class BlockManager:
             return True
         return False
     
+    def block_many(self, users: dict, admin_id: int = None, reason: str = "", duration: int = None) -> list:
+        """Блокировка списка пользователей с одним сохранением.
+
+        users: {user_id: данные из UserManager или None}. Возвращает ID,
+        которые были заблокированы (уже заблокированные пропускаются).
+        """
+        blocked = []
+        blocked_at = datetime.now().isoformat()
+        expires_at = (datetime.now() + timedelta(seconds=duration)).isoformat() if duration else None
+        for user_id, user_info in users.items():
+            user_id_str = str(user_id)
+            if user_id_str in self.blocked_users:
+                continue
+            user_info = user_info or {}
+            self.blocked_users[user_id_str] = {
+                "username": user_info.get("username", ""),
+                "first_name": user_info.get("first_name", ""),
+                "last_name": user_info.get("last_name", ""),
+                "blocked_at": blocked_at,
+                "blocked_by": admin_id,
+                "reason": reason,
+                "expires_at": expires_at
+            }
+            self.log_block_unblock(user_id, "block", admin_id)
+            blocked.append(user_id)
+        if blocked:
+            self.save_blocked()
+            if self.on_block is not None:
+                for user_id in blocked:
+                    self.on_block(str(user_id), self.blocked_users[str(user_id)])
+        return blocked
+    
+    def unblock_many(self, user_ids: list, admin_id: int = None) -> list:
+        """Разблокировка списка пользователей с одним сохранением"""
+        unblocked = []
+        for user_id in user_ids:
+            if self.blocked_users.pop(str(user_id), None) is not None:
+                self.log_block_unblock(user_id, "unblock", admin_id)
+                unblocked.append(user_id)
+        if unblocked:
+            self.save_blocked()
+        return unblocked
+    
     def log_block_unblock(self, user_id: int, action: str, admin_id: int = None):
         """Логирование блокировок/разблокировок"""
         log_entry = {
@@ -138,8 +370,7 @@ class PostLogger:
     
     def save_logs(self):
         """Сохранение логов"""
-        with open(self.filename, 'w', encoding='utf-8') as f:
-            json.dump(self.logs, f, ensure_ascii=False, indent=2)
+        write_json(self.filename, self.logs)
     
     def add_post(self, post_data: dict):
         """Добавление записи о посте"""
@@ -170,6 +401,127 @@ class PostLogger:
             }
         return None
 
+# Колоночное хранилище постов для аналитики: массивы фиксированного типа вместо списка словарей
+class PostStats:
+    COLUMNS = {"user_id": "q", "ts": "I", "media": "B", "length": "I"}
+    MEDIA_TYPES = ["other", "text", "photo", "video", "document", "voice", "audio",
+                   "sticker", "animation", "video_note"]
+    
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.columns = self.load_columns()
+        self.user_id = self.columns["user_id"]
+        self.ts = self.columns["ts"]  # Время по возрастанию: окно по времени ищется бинарным поиском
+        self.media = self.columns["media"]
+        self.length = self.columns["length"]
+        self._aggregate = None  # Агрегаты последнего запрошенного окна
+    
+    def load_columns(self) -> dict:
+        """Загрузка колонок; после сбоя посреди записи лишний хвост отбрасывается"""
+        columns = {name: array(typecode) for name, typecode in self.COLUMNS.items()}
+        for name, column in columns.items():
+            path = f"{self.filename}.{name}"
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                column.frombytes(data[:len(data) - len(data) % column.itemsize])
+        rows = min(len(column) for column in columns.values())
+        for name, column in columns.items():
+            if len(column) > rows:
+                del column[rows:]
+                with open(f"{self.filename}.{name}", 'wb') as f:
+                    column.tofile(f)
+        return columns
+    
+    def add(self, user_id: int, timestamp: float, media_type: str, length: int):
+        """Добавление поста (дописывается в конец файлов колонок)"""
+        # Время не убывает, даже если часы сдвинулись назад
+        row = {
+            "user_id": user_id,
+            "ts": max(int(timestamp), self.ts[-1] if self.ts else 0),
+            "media": self.MEDIA_TYPES.index(media_type) if media_type in self.MEDIA_TYPES else 0,
+            "length": min(length, 0xFFFFFFFF)
+        }
+        for name, column in self.columns.items():
+            column.append(row[name])
+            with open(f"{self.filename}.{name}", 'ab') as f:
+                f.write(column[-1:].tobytes())
+    
+    def backfill(self, logs: list):
+        """Заполнение пустого хранилища из журнала постов"""
+        for post in logs:
+            self.add(
+                post["user_id"], datetime.fromisoformat(post["timestamp"]).timestamp(),
+                post.get("media_type", ""), len(post.get("content") or "")
+            )
+    
+    def window(self, since: float, until: float = None) -> tuple:
+        """Границы строк [lo, hi) за период"""
+        lo = bisect.bisect_left(self.ts, since)
+        hi = bisect.bisect_left(self.ts, until, lo) if until is not None else len(self.ts)
+        return lo, hi
+    
+    def histogram(self, since: float, bucket: float, buckets: int) -> list:
+        """Число постов по интервалам: по одному бинарному поиску на границу"""
+        bounds = [bisect.bisect_left(self.ts, since + i * bucket) for i in range(buckets + 1)]
+        return [hi - lo for lo, hi in zip(bounds, bounds[1:])]
+    
+    def aggregate(self, since: float) -> dict:
+        """Агрегаты окна [since, сейчас).
+
+        Хранилище только дописывается, а начало окна сдвигается раз в сутки,
+        поэтому агрегаты обновляются на добавленные и вышедшие из окна строки
+        вместо полного прохода по колонкам.
+        """
+        lo, hi = self.window(since)
+        agg = self._aggregate
+        if agg is None or not agg["lo"] <= lo <= agg["hi"]:
+            agg = self._aggregate = {
+                "lo": lo, "hi": lo, "senders": Counter(), "media": Counter(),
+                "length_sum": 0, "max_length": 0
+            }
+        
+        if lo > agg["lo"]:
+            expired = slice(agg["lo"], lo)
+            expired_senders = Counter(self.user_id[expired])
+            agg["senders"].subtract(expired_senders)
+            for sender_id in expired_senders:
+                if agg["senders"][sender_id] <= 0:
+                    del agg["senders"][sender_id]
+            agg["media"].subtract(Counter(self.media[expired].tobytes()))
+            expired_lengths = self.length[expired]
+            agg["length_sum"] -= sum(expired_lengths)
+            if max(expired_lengths) >= agg["max_length"]:
+                agg["max_length"] = max(self.length[lo:agg["hi"]], default=0)
+            agg["lo"] = lo
+        
+        if hi > agg["hi"]:
+            added = slice(agg["hi"], hi)
+            agg["senders"].update(self.user_id[added])
+            agg["media"].update(self.media[added].tobytes())
+            added_lengths = self.length[added]
+            agg["length_sum"] += sum(added_lengths)
+            agg["max_length"] = max(agg["max_length"], max(added_lengths))
+            agg["hi"] = hi
+        return agg
+    
+    def top_senders(self, since: float, n: int = 5) -> list:
+        return self.aggregate(since)["senders"].most_common(n)
+    
+    def media_mix(self, since: float) -> dict:
+        media = self.aggregate(since)["media"]
+        return {name: media[code] for code, name in enumerate(self.MEDIA_TYPES) if media[code] > 0}
+    
+    def summary(self, since: float) -> dict:
+        agg = self.aggregate(since)
+        posts = agg["hi"] - agg["lo"]
+        return {
+            "posts": posts,
+            "senders": len(agg["senders"]),
+            "avg_length": agg["length_sum"] / posts if posts else 0,
+            "max_length": agg["max_length"]
+        }
+
 # Менеджер пользователей
 class UserManager:
     def __init__(self, filename: str):
@@ -185,8 +537,7 @@ class UserManager:
     
     def save_users(self):
         """Сохранение данных о пользователях"""
-        with open(self.filename, 'w', encoding='utf-8') as f:
-            json.dump(self.users, f, ensure_ascii=False, indent=2)
+        write_json(self.filename, self.users)
     
     def add_user(self, user_id: int, username: str = "", 
                  first_name: str = "", last_name: str = ""):
@@ -231,16 +582,1376 @@ class UserManager:
             }
         return None
 
+# Очередь доставки постов администраторам
+class PostQueue:
+    def __init__(self, dirname: str, tenant: "Tenant", limit: int = POST_QUEUE_LIMIT):
+        self.dirname = dirname
+        self.tenant = tenant
+        self.limit = limit
+        os.makedirs(dirname, exist_ok=True)
+        self.items = self.load_queue()
+        self._queue = asyncio.Queue()  # Только первые посты пользователей из _pending
+        self._pending = {}  # user_id -> deque(item_id) в порядке постановки
+        self._space = asyncio.Event()
+        self._workers = []
+        self._next_id = max((item["id"] for item in self.items.values()), default=0) + 1
+        for item in sorted(self.items.values(), key=lambda item: item["id"]):
+            self._enqueue(item)
+    
+    def load_queue(self) -> dict:
+        """Загрузка недоставленных постов"""
+        items = {}
+        for name in os.listdir(self.dirname):
+            if name.endswith(".json"):
+                with open(os.path.join(self.dirname, name), 'r', encoding='utf-8') as f:
+                    item = json.load(f)
+                items[str(item["id"])] = item
+        return items
+    
+    def item_path(self, item_id) -> str:
+        return os.path.join(self.dirname, f"{item_id}.json")
+    
+    def save_item(self, item: dict):
+        """Сохранение одного поста: остальная очередь не перезаписывается"""
+        write_json(self.item_path(item["id"]), item)
+    
+    def _enqueue(self, item: dict):
+        """Пост пользователя ставится в очередь воркеров, только когда доставлены предыдущие.
+
+        Пока пост ждет повтора, следующие посты того же пользователя ждут за ним,
+        и админы получают их в порядке отправки.
+        """
+        pending = self._pending.setdefault(item["user"]["id"], deque())
+        pending.append(str(item["id"]))
+        if len(pending) == 1:
+            self._queue.put_nowait(str(item["id"]))
+    
+    def remove_item(self, item_id: str):
+        """Снятие поста с очереди; следующий пост пользователя передается воркерам"""
+        item = self.items.pop(item_id)
+        try:
+            os.remove(self.item_path(item_id))
+        except FileNotFoundError:
+            pass
+        user_id = item["user"]["id"]
+        pending = self._pending[user_id]
+        pending.remove(item_id)
+        if pending:
+            self._queue.put_nowait(pending[0])
+        else:
+            del self._pending[user_id]
+        if len(self.items) < self.limit:
+            self._space.set()
+    
+    async def wait_for_space(self, timeout: float = POST_QUEUE_WAIT) -> bool:
+        """Ожидание места в очереди; False - очередь так и не освободилась"""
+        deadline = time.monotonic() + timeout
+        while len(self.items) >= self.limit:
+            self._space.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+    
+    def put(self, message: Message, user: types.User, tags: list = None) -> bool:
+        """Постановка поста в очередь.
+
+        Пост сохраняется на диск до подтверждения пользователю.
+        Возвращает True, если очередь переполнена и доставка задерживается.
+        """
+        self.tenant.post_logger.add_post({
+            "user_id": user.id,
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "content": message.text or message.caption or "",
+            "media_type": message.content_type,
+            "timestamp": datetime.now().isoformat(),
+            "message_id": message.message_id,
+            "chat_id": message.chat.id
+        })
+        self.tenant.post_stats.add(
+            user.id, time.time(), message.content_type, len(message.text or message.caption or "")
+        )
+        
+        item_id = self._next_id
+        self._next_id += 1
+        item = self.items[str(item_id)] = {
+            "id": item_id,
+            "message": message.model_dump(mode="json", exclude_none=True, by_alias=True),
+            "user": user.model_dump(mode="json", exclude_none=True, by_alias=True),
+            "pending_admins": list(self.tenant.admin_ids),
+            "tags": tags or [],
+            "attempts": 0,
+            "created_at": datetime.now().isoformat()
+        }
+        self.save_item(item)
+        self._enqueue(item)
+        return len(self.items) > self.limit
+    
+    async def start(self, workers: int = POST_WORKERS):
+        """Запуск воркеров (очередь восстанавливается с диска при создании)"""
+        if self.items:
+            logger.info("[%s] Восстановлено недоставленных постов: %s", self.tenant.name, len(self.items))
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(workers)]
+    
+    async def stop(self):
+        """Остановка воркеров (недоставленные посты остаются на диске)"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def join(self):
+        """Ожидание обработки всех постов, уже стоящих в очереди"""
+        await self._queue.join()
+    
+    async def _worker(self):
+        while True:
+            item_id = await self._queue.get()
+            try:
+                await self._deliver(item_id)
+            except Exception as e:
+                # Пост остается первым в очереди пользователя, иначе его следующие посты встанут навсегда
+                logger.error("Ошибка доставки поста %s: %s", item_id, e)
+                if item_id in self.items:
+                    asyncio.get_running_loop().call_later(POST_RETRY_MAX, self._queue.put_nowait, item_id)
+            finally:
+                self._queue.task_done()
+    
+    async def _deliver(self, item_id: str):
+        """Доставка поста оставшимся администраторам с повтором при временной ошибке"""
+        item = self.items.get(item_id)
+        if item is None:
+            return
+        
+        # Админы, снятые с роли после постановки поста, его уже не получают
+        pending = [admin_id for admin_id in item["pending_admins"] if admin_id in self.tenant.admin_ids]
+        failed = {}
+        if pending:
+            message = Message.model_validate(item["message"])
+            user = types.User.model_validate(item["user"])
+            sent_messages = await send_post_to_admins(
+                self.tenant, message, user, pending, item.get("tags"), failed=failed
+            )
+            pending = [admin_id for admin_id in pending if admin_id not in sent_messages]
+        
+        # Бот заблокирован админом или Telegram отверг сам пост - повтор не поможет
+        permanent = [
+            admin_id for admin_id in pending
+            if isinstance(failed.get(admin_id), (TelegramForbiddenError, TelegramBadRequest))
+        ]
+        if permanent:
+            logger.warning("[%s] Пост %s не будет доставлен админам %s", self.tenant.name, item_id, permanent)
+        item["pending_admins"] = [admin_id for admin_id in pending if admin_id not in permanent]
+        if not item["pending_admins"]:
+            self.remove_item(item_id)
+            return
+        
+        # Временная ошибка (Telegram недоступен, сеть): пост остается на диске и повторяется
+        # без ограничения числа попыток, задержка растет экспоненциально до POST_RETRY_MAX
+        item["attempts"] += 1
+        delay = min(POST_RETRY_BASE * 2 ** min(item["attempts"] - 1, 20), POST_RETRY_MAX)
+        self.save_item(item)
+        logger.warning(
+            "[%s] Пост %s не доставлен админам %s, повтор через %s сек.",
+            self.tenant.name, item_id, item["pending_admins"], delay
+        )
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item_id)
+
+# Последовательное выполнение апдейтов одного пользователя
+class KeyedSerialExecutor:
+    def __init__(self, concurrency: int = UPDATE_CONCURRENCY, stats_limit: int = 1000):
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._keys = {}  # key -> {"lock": asyncio.Lock, "waiters": int}
+        self.stats_limit = stats_limit
+        self.key_stats = OrderedDict()  # Задержка в очереди по ключам (последние stats_limit)
+    
+    async def run(self, key, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнение func строго по порядку для одного ключа и параллельно для разных"""
+        entry = self._keys.get(key)
+        if entry is None:
+            entry = self._keys[key] = {"lock": asyncio.Lock(), "waiters": 0}
+        entry["waiters"] += 1
+        loop = asyncio.get_running_loop()
+        enqueued_at = loop.time()
+        try:
+            async with entry["lock"]:
+                async with self._semaphore:
+                    self._record_delay(key, loop.time() - enqueued_at)
+                    return await func()
+        finally:
+            entry["waiters"] -= 1
+            # Удаляем простаивающие ключи
+            if entry["waiters"] == 0:
+                self._keys.pop(key, None)
+    
+    def _record_delay(self, key, delay: float):
+        """Учет задержки в очереди"""
+        stats = self.key_stats.pop(key, None) or {"count": 0, "total_delay": 0.0, "max_delay": 0.0}
+        stats["count"] += 1
+        stats["total_delay"] += delay
+        stats["max_delay"] = max(stats["max_delay"], delay)
+        self.key_stats[key] = stats
+        if len(self.key_stats) > self.stats_limit:
+            self.key_stats.popitem(last=False)
+    
+    def get_stats(self) -> dict:
+        """Получение сводной статистики задержек"""
+        count = sum(s["count"] for s in self.key_stats.values())
+        total_delay = sum(s["total_delay"] for s in self.key_stats.values())
+        max_delay = max((s["max_delay"] for s in self.key_stats.values()), default=0.0)
+        return {
+            "active_keys": len(self._keys),
+            "avg_delay": total_delay / count if count else 0.0,
+            "max_delay": max_delay
+        }
+
+class LogContextMiddleware(BaseMiddleware):
+    """Внешний middleware: контекст апдейта для логов и замер времени обработки"""
+    
+    async def __call__(self, handler, event, data: dict):
+        user = data.get("event_from_user")
+        tenant = data.get("tenant")
+        context = {
+            "tenant": tenant.name if tenant else None,
+            "update_id": event.update_id,
+            "user_id": user.id if user else None
+        }
+        token = log_context.set(context)
+        started_at = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            latency_ms = round((time.perf_counter() - started_at) * 1000, 2)
+            logger.info("Апдейт обработан", extra={"latency_ms": latency_ms})
+            log_context.reset(token)
+
+class DeduplicateUpdateMiddleware(BaseMiddleware):
+    """Внешний middleware: повторно доставленный апдейт отбрасывается до обработчиков"""
+    
+    async def __call__(self, handler, event, data: dict):
+        updates = data["tenant"].processed_updates
+        if not updates.begin(event.update_id):
+            logger.info("Повторный апдейт пропущен")
+            return None
+        try:
+            return await handler(event, data)
+        finally:
+            updates.finish(event.update_id)
+
+class ReviveChatMiddleware(BaseMiddleware):
+    """Внешний middleware: личный чат, из которого пришел апдейт, снова доступен боту"""
+    
+    async def __call__(self, handler, event, data: dict):
+        chat = data.get("event_chat")
+        if chat is not None and chat.type == "private":
+            data["tenant"].delivery_guard.revive(chat.id)
+        return await handler(event, data)
+
+class HandlerNameMiddleware(BaseMiddleware):
+    """Внутренний middleware: имя выбранного обработчика в контексте логов"""
+    
+    async def __call__(self, handler, event, data: dict):
+        handler_object = data.get("handler")
+        if handler_object is not None:
+            log_context.set({**log_context.get(), "handler": handler_object.callback.__name__})
+        return await handler(event, data)
+
+class PostIntakeMiddleware(BaseMiddleware):
+    """Внешний middleware: при переполненной очереди доставки сообщения пользователей
+    придерживаются до POST_QUEUE_WAIT секунд.
+
+    Ожидание идет до SerialUpdateMiddleware и не занимает слоты update_executor,
+    поэтому админы и остальные апдейты обрабатываются без задержки. После ожидания
+    пост все равно принимается.
+    """
+    
+    async def __call__(self, handler, event, data: dict):
+        user = data.get("event_from_user")
+        tenant = data["tenant"]
+        if event.message is not None and user is not None and user.id not in tenant.admin_ids:
+            await tenant.post_queue.wait_for_space()
+        return await handler(event, data)
+
+class SerialUpdateMiddleware(BaseMiddleware):
+    """Внешний middleware: апдейты одного пользователя выполняются по очереди"""
+    
+    def __init__(self, executor: KeyedSerialExecutor):
+        self.executor = executor
+    
+    async def __call__(self, handler, event, data: dict):
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+        return await self.executor.run((data["bot"].id, user.id), lambda: handler(event, data))
+
+# Профилирование по команде администратора
+class RuntimeProfiler:
+    def __init__(self):
+        self.profile_task = None
+        self.memory_baseline = None
+    
+    @property
+    def is_profiling(self) -> bool:
+        return self.profile_task is not None and not self.profile_task.done()
+    
+    def start_profile(self, seconds: int, on_done: Callable[[str], Awaitable[Any]]):
+        """Запуск cProfile на заданное время; отчет передается в on_done"""
+        self.profile_task = asyncio.create_task(self._run_profile(seconds, on_done))
+    
+    def stop_profile(self) -> bool:
+        """Досрочная остановка профилирования (отчет все равно будет отправлен)"""
+        if not self.is_profiling:
+            return False
+        self.profile_task.cancel()
+        return True
+    
+    async def _run_profile(self, seconds: int, on_done: Callable[[str], Awaitable[Any]]):
+        profiler = cProfile.Profile()
+        started_at = datetime.now()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            profiler.disable()
+        
+        elapsed = (datetime.now() - started_at).total_seconds()
+        stream = io.StringIO()
+        stream.write(f"Профилирование: {elapsed:.1f} сек., начато {started_at.isoformat()}\n\n")
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP)
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_TOP)
+        try:
+            await on_done(stream.getvalue())
+        except Exception as e:
+            logger.error("Не удалось отправить отчет профилировщика: %s", e)
+    
+    def memory_snapshot(self) -> str:
+        """Снимок памяти: при первом вызове запускает tracemalloc и запоминает базу,
+        при следующих возвращает разницу с базой"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.memory_baseline = tracemalloc.take_snapshot()
+            return None
+        
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [
+            f"Снимок памяти: {datetime.now().isoformat()}",
+            f"Отслеживается: {current / 1024:.1f} КБ (пик {peak / 1024:.1f} КБ)",
+            *(
+                f"[{tenant.name}] пользователей: {len(tenant.user_manager.users)}, "
+                f"постов в логе: {len(tenant.post_logger.logs)}, "
+                f"заблокировано: {len(tenant.block_manager.blocked_users)}, "
+                f"в очереди: {len(tenant.post_queue.items)}"
+                for tenant in tenants.values()
+            ),
+            "",
+            f"Топ-{PROFILE_TOP} мест выделения памяти относительно базы:"
+        ]
+        for stat in snapshot.compare_to(self.memory_baseline, "lineno")[:PROFILE_TOP]:
+            lines.append(str(stat))
+        return "\n".join(lines)
+    
+    def stop_memory(self) -> bool:
+        """Остановка tracemalloc"""
+        if not tracemalloc.is_tracing():
+            return False
+        tracemalloc.stop()
+        self.memory_baseline = None
+        return True
+
+# Фильтр запрещенных слов
+# Похожие кириллические и латинские символы сводятся к одному
+HOMOGLYPHS = str.maketrans({
+    "а": "a", "в": "b", "е": "e", "ё": "e", "з": "3", "к": "k", "м": "m", "н": "h",
+    "о": "o", "р": "p", "с": "c", "т": "t", "у": "y", "х": "x", "0": "o", "@": "a"
+})
+
+def normalize_text(text: str) -> str:
+    """Нормализация текста для поиска: регистр и похожие символы"""
+    return text.casefold().translate(HOMOGLYPHS)
+
+class AhoCorasick:
+    """Автомат Ахо-Корасик: поиск всех шаблонов за один проход по тексту"""
+    
+    def __init__(self, patterns: dict):
+        # patterns: нормализованный шаблон -> значение, возвращаемое при совпадении
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern, value in patterns.items():
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = next_node
+            self.output[node].append(value)
+        
+        # Суффиксные ссылки строятся обходом в ширину
+        queue_nodes = list(self.goto[0].values())
+        for node in queue_nodes:
+            for char, child in self.goto[node].items():
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+                queue_nodes.append(child)
+    
+    def search(self, text: str) -> set:
+        """Значения всех шаблонов, встречающихся в тексте"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+class ContentFilter:
+    # Действия по возрастанию строгости
+    ACTIONS = ("tag", "hold", "reject")
+    
+    def __init__(self, filename: str, held_filename: str):
+        self.filename = filename
+        self.held_filename = held_filename
+        self.words = self.load_words()
+        self.held = self.load_held()
+        self.automaton = AhoCorasick(self._patterns())
+        self._version = 0
+    
+    def load_words(self) -> dict:
+        """Загрузка списка запрещенных слов"""
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+    
+    def save_words(self):
+        """Сохранение списка запрещенных слов"""
+        write_json(self.filename, self.words)
+    
+    def load_held(self) -> dict:
+        """Загрузка задержанных постов"""
+        if os.path.exists(self.held_filename):
+            with open(self.held_filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+    
+    def save_held(self):
+        """Сохранение задержанных постов"""
+        write_json(self.held_filename, self.held)
+    
+    def _patterns(self) -> dict:
+        return {normalize_text(word): word for word in self.words}
+    
+    async def rebuild(self):
+        """Перестроение автомата в отдельном потоке и атомарная замена"""
+        self._version += 1
+        version = self._version
+        automaton = await asyncio.get_running_loop().run_in_executor(None, AhoCorasick, self._patterns())
+        # Более поздняя перестройка могла завершиться раньше
+        if version == self._version:
+            self.automaton = automaton
+    
+    async def reload(self):
+        """Перечитать список с диска (изменен другим процессом)"""
+        self.words = self.load_words()
+        await self.rebuild()
+    
+    async def add_word(self, word: str, action: str):
+        """Добавление запрещенного слова"""
+        self.words[word] = action
+        self.save_words()
+        await self.rebuild()
+    
+    async def remove_word(self, word: str) -> bool:
+        """Удаление запрещенного слова"""
+        if word not in self.words:
+            return False
+        del self.words[word]
+        self.save_words()
+        await self.rebuild()
+        return True
+    
+    def check(self, message: Message) -> tuple:
+        """Проверка текста и подписи: (самое строгое действие или None, найденные слова)"""
+        text = message.text or message.caption
+        if not text or not self.words:
+            return None, []
+        words = self.automaton.search(normalize_text(text))
+        actions = [self.words[word] for word in words if word in self.words]
+        if not actions:
+            return None, []
+        return max(actions, key=self.ACTIONS.index), sorted(words)
+    
+    def hold_post(self, message: Message, user: types.User, words: list) -> str:
+        """Сохранение задержанного поста до решения администратора"""
+        held_id = f"{user.id}_{message.message_id}"
+        self.held[held_id] = {
+            "message": message.model_dump(mode="json", exclude_none=True, by_alias=True),
+            "user": user.model_dump(mode="json", exclude_none=True, by_alias=True),
+            "words": words,
+            "held_at": datetime.now().isoformat()
+        }
+        self.save_held()
+        return held_id
+    
+    def pop_held(self, held_id: str) -> dict:
+        """Извлечение задержанного поста"""
+        item = self.held.pop(held_id, None)
+        if item is not None:
+            self.save_held()
+        return item
+
+# Таймер на min-heap: спит до ближайшего срока вместо опроса всех записей
+class HeapTimer(abc.ABC):
+    def __init__(self):
+        self._heap = []  # (срок, ключ)
+        self._wakeup = asyncio.Event()
+        self._task = None
+    
+    @abc.abstractmethod
+    def _due(self, key: str) -> float:
+        """Актуальный срок для ключа; None - запись отменена"""
+    
+    @abc.abstractmethod
+    async def _fire(self, key: str):
+        """Обработка наступившего срока"""
+    
+    def _push(self, due: float, key: str):
+        heapq.heappush(self._heap, (due, key))
+        # Будим таймер, если новый срок раньше текущего ожидания
+        if self._heap[0][1] == key:
+            self._wakeup.set()
+    
+    async def start(self):
+        """Запуск таймера"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка таймера"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        while True:
+            # Пропускаем отмененные и перенесенные записи
+            while self._heap and self._due(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                # call_later вместо wait_for: wait_for может проглотить отмену,
+                # если событие выставлено одновременно с stop()
+                self._wakeup.clear()
+                timer = asyncio.get_running_loop().call_later(delay, self._wakeup.set) if delay else None
+                try:
+                    await self._wakeup.wait()
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                continue
+            
+            _, key = heapq.heappop(self._heap)
+            try:
+                await self._fire(key)
+            except Exception as e:
+                logger.error("Ошибка обработки таймера %s: %s", key, e)
+
+# Расписание публикаций в канал
+class PublicationScheduler(HeapTimer):
+    def __init__(self, filename: str, tenant: "Tenant"):
+        super().__init__()
+        self.filename = filename
+        self.tenant = tenant
+        self.entries, published = self.load_schedule()
+        # Недавно опубликованные посты, чтобы второй админ не опубликовал их повторно
+        self.published = OrderedDict.fromkeys(published)
+        self._heap = [(entry["publish_at"], entry_id) for entry_id, entry in self.entries.items()]
+        heapq.heapify(self._heap)
+        self._last_slot = max((entry["publish_at"] for entry in self.entries.values()), default=0)
+    
+    def load_schedule(self) -> tuple:
+        """Загрузка расписания"""
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data["pending"], data["published"]
+        return {}, []
+    
+    def save_schedule(self):
+        """Сохранение расписания"""
+        write_json(self.filename, {"pending": self.entries, "published": list(self.published)})
+    
+    def next_slot(self) -> float:
+        """Ближайшее свободное время публикации"""
+        now = time.time()
+        if not self.tenant.publish_slots:
+            return max(now, self._last_slot + self.tenant.publish_spacing)
+        
+        base = max(now, self._last_slot + 1)
+        base_date = datetime.fromtimestamp(base).date()
+        slots = sorted(datetime.strptime(slot, "%H:%M").time() for slot in self.tenant.publish_slots)
+        for day in range(366):
+            for slot in slots:
+                candidate = datetime.combine(base_date + timedelta(days=day), slot).timestamp()
+                if candidate >= base:
+                    return candidate
+        return base
+    
+    def upcoming_slots(self, count: int) -> list:
+        """Несколько ближайших свободных времен публикации подряд"""
+        last_slot = self._last_slot
+        slots = []
+        try:
+            for _ in range(count):
+                self._last_slot = self.next_slot()
+                slots.append(self._last_slot)
+        finally:
+            self._last_slot = last_slot
+        return slots
+    
+    def schedule(self, chat_id: int, message_id: int, publish_at: float = None) -> float:
+        """Постановка поста в расписание; None - пост уже в расписании.
+
+        Время раньше ближайшего свободного слота (или слот уже занят другим
+        постом) заменяется ближайшим свободным, чтобы соблюдались слоты и интервал.
+        """
+        entry_id = f"{chat_id}_{message_id}"
+        if entry_id in self.entries or entry_id in self.published:
+            return None
+        next_slot = self.next_slot()
+        if publish_at is None or publish_at < next_slot:
+            publish_at = next_slot
+        self._last_slot = max(self._last_slot, publish_at)
+        self.entries[entry_id] = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "publish_at": publish_at,
+            "attempts": 0
+        }
+        self.save_schedule()
+        self._push(publish_at, entry_id)
+        return publish_at
+    
+    def cancel(self, chat_id: int, message_id: int) -> bool:
+        """Удаление поста из расписания (запись в куче пропускается при извлечении)"""
+        if self.entries.pop(f"{chat_id}_{message_id}", None) is None:
+            return False
+        self.save_schedule()
+        return True
+    
+    def _due(self, entry_id: str) -> float:
+        return self.entries.get(entry_id, {}).get("publish_at")
+    
+    async def _fire(self, entry_id: str):
+        """Публикация поста в канал с повтором при ошибке"""
+        entry = self.entries[entry_id]
+        try:
+            await self.tenant.bot.copy_message(
+                chat_id=self.tenant.channel_id,
+                from_chat_id=entry["chat_id"],
+                message_id=entry["message_id"]
+            )
+        except Exception as e:
+            entry["attempts"] += 1
+            if entry["attempts"] >= PUBLISH_MAX_ATTEMPTS:
+                del self.entries[entry_id]
+                logger.error("[%s] Пост %s не опубликован: %s", self.tenant.name, entry_id, e)
+            else:
+                entry["publish_at"] = time.time() + 60 * 2 ** entry["attempts"]
+                self._push(entry["publish_at"], entry_id)
+                logger.warning("[%s] Повтор публикации %s: %s", self.tenant.name, entry_id, e)
+            self.save_schedule()
+            return
+        
+        del self.entries[entry_id]
+        self.published[entry_id] = None
+        if len(self.published) > 1000:
+            self.published.popitem(last=False)
+        self.save_schedule()
+        logger.info("[%s] Пост %s опубликован", self.tenant.name, entry_id)
+
+# Индекс (чат админа, сообщение) -> пользователь для ответа обычным reply
+class ReplyIndex:
+    def __init__(self, filename: str, max_size: int = REPLY_INDEX_SIZE, ttl: float = REPLY_INDEX_TTL):
+        self.filename = filename
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = self.load_index()  # "chat_id:message_id" -> [user_id, время], старые в начале
+        self.on_put = None  # Вызывается после добавления (используется в шардированном режиме)
+        self._save_handle = None
+    
+    def load_index(self) -> OrderedDict:
+        """Загрузка индекса"""
+        if os.path.exists(self.filename):
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                return OrderedDict((key, [user_id, added_at]) for key, user_id, added_at in json.load(f))
+        return OrderedDict()
+    
+    def save_index(self):
+        """Сохранение индекса"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        write_json(self.filename, [[key, user_id, added_at] for key, (user_id, added_at) in self.entries.items()])
+    
+    def put(self, chat_id: int, message_id: int, user_id: int):
+        """Добавление сообщения админа"""
+        key = f"{chat_id}:{message_id}"
+        self.entries[key] = [user_id, time.time()]
+        self.entries.move_to_end(key)
+        self._evict()
+        self._schedule_save()
+        if self.on_put is not None:
+            self.on_put(chat_id, message_id, user_id)
+    
+    def get(self, chat_id: int, message_id: int) -> int:
+        """Пользователь, которому было адресовано сообщение админа, или None"""
+        key = f"{chat_id}:{message_id}"
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[1] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[0]
+    
+    def _evict(self):
+        """Вытеснение самых давно использованных и устаревших записей"""
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        expire_before = time.time() - self.ttl
+        while self.entries and next(iter(self.entries.values()))[1] < expire_before:
+            self.entries.popitem(last=False)
+    
+    def _schedule_save(self):
+        """Отложенное сохранение: серия добавлений записывается один раз"""
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_later(REPLY_INDEX_SAVE_DELAY, self.save_index)
+
+# Отсев повторно доставленных апдейтов: битовая карта последних update_id
+class UpdateDeduplicator:
+    """Окно из window последних update_id до максимального обработанного (high).
+
+    Бит update_id % window отмечает обработанный апдейт; при сдвиге high биты
+    для новых номеров очищаются. Апдейты старше окна считаются обработанными.
+    Обрабатываемые сейчас апдейты (in_flight) хранятся только в памяти и
+    защищают от одновременной повторной доставки. getUpdates подтверждает
+    пачку следующим запросом, поэтому апдейт, прерванный сбоем, Telegram
+    повторно не пришлет, и хранить его после перезапуска незачем.
+    """
+    
+    def __init__(self, filename: str, window: int = UPDATE_DEDUP_WINDOW):
+        self.filename = filename
+        self.window = window
+        self.high = -1
+        self.bitmap = bytearray((window + 7) // 8)
+        self.in_flight = set()
+        self.duplicates = 0
+        self._save_handle = None
+        self.load_state()
+    
+    def load_state(self):
+        """Загрузка состояния"""
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        bitmap = base64.b64decode(data["bitmap"])
+        if len(bitmap) == len(self.bitmap):
+            self.high = data["high"]
+            self.bitmap[:] = bitmap
+        else:
+            # Размер окна изменился: помним только отметку
+            self.high = data["high"]
+            self.bitmap[:] = bytes([0xFF]) * len(self.bitmap)
+    
+    def save_state(self):
+        """Сохранение состояния"""
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        write_json(self.filename, {
+            "high": self.high,
+            "bitmap": base64.b64encode(self.bitmap).decode()
+        })
+    
+    def resume_offset(self) -> int:
+        """С какого update_id продолжать получение апдейтов (None - с начала)"""
+        return self.high + 1 if self.high >= 0 else None
+    
+    def _is_done(self, update_id: int) -> bool:
+        if update_id > self.high:
+            return False
+        if update_id <= self.high - self.window:
+            return True
+        bit = update_id % self.window
+        return bool(self.bitmap[bit >> 3] & (1 << (bit & 7)))
+    
+    def begin(self, update_id: int) -> bool:
+        """Отметка начала обработки; False - апдейт уже обработан или обрабатывается"""
+        if update_id in self.in_flight or self._is_done(update_id):
+            self.duplicates += 1
+            return False
+        self.in_flight.add(update_id)
+        return True
+    
+    def finish(self, update_id: int):
+        """Отметка завершения обработки"""
+        self.in_flight.discard(update_id)
+        if update_id > self.high:
+            # Очищаем биты номеров, которые войдут в окно
+            for skipped in range(max(self.high + 1, update_id - self.window + 1), update_id + 1):
+                bit = skipped % self.window
+                self.bitmap[bit >> 3] &= ~(1 << (bit & 7)) & 0xFF
+            self.high = update_id
+        if update_id > self.high - self.window:
+            bit = update_id % self.window
+            self.bitmap[bit >> 3] |= 1 << (bit & 7)
+        self._schedule_save()
+    
+    def _schedule_save(self):
+        """Сохранение в конце текущей итерации цикла: пачка апдейтов записывается один раз"""
+        if self._save_handle is None:
+            self._save_handle = asyncio.get_running_loop().call_soon(self.save_state)
+
+# Сроки блокировки: "30m", "12ч", "7d", "2н"
+DURATION_UNITS = {"m": 60, "м": 60, "h": 3600, "ч": 3600, "d": 86400, "д": 86400, "w": 604800, "н": 604800}
+BLOCK_DURATIONS = [("1ч", 3600), ("1д", 86400), ("7д", 604800)]
+
+def parse_duration(text: str) -> int:
+    """Срок в секундах или None, если строка не является сроком"""
+    match = re.fullmatch(r"(\d+)\s*([a-zа-я])", text.strip().lower())
+    if not match or match.group(2) not in DURATION_UNITS or int(match.group(1)) == 0:
+        return None
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+def format_expiry(data: dict) -> str:
+    """Срок окончания блокировки для сообщений админам и пользователям"""
+    expires_at = data.get("expires_at")
+    if not expires_at:
+        return "навсегда"
+    return "до " + datetime.fromisoformat(expires_at).strftime('%d.%m.%Y %H:%M')
+
+# Автоматическое снятие временных блокировок
+class BanExpiryScheduler(HeapTimer):
+    def __init__(self, tenant: "Tenant"):
+        super().__init__()
+        self.tenant = tenant
+        self.owns = None  # Фильтр user_id: чьи блокировки снимает этот процесс (шардированный режим)
+    
+    @staticmethod
+    def expiry_ts(data: dict) -> float:
+        expires_at = data.get("expires_at")
+        return datetime.fromisoformat(expires_at).timestamp() if expires_at else None
+    
+    def track(self, user_id_str: str, data: dict):
+        """Учет новой блокировки (вызывается BlockManager)"""
+        expires_at = self.expiry_ts(data)
+        if expires_at is not None and (self.owns is None or self.owns(int(user_id_str))):
+            self._push(expires_at, user_id_str)
+    
+    async def start(self):
+        """Восстановление сроков из списка блокировок и запуск таймера"""
+        self._heap = [
+            (self.expiry_ts(data), user_id_str)
+            for user_id_str, data in self.tenant.block_manager.blocked_users.items()
+            if data.get("expires_at") and (self.owns is None or self.owns(int(user_id_str)))
+        ]
+        heapq.heapify(self._heap)
+        self.tenant.block_manager.on_block = self.track
+        await super().start()
+    
+    def _due(self, user_id_str: str) -> float:
+        data = self.tenant.block_manager.blocked_users.get(user_id_str)
+        return self.expiry_ts(data) if data else None
+    
+    async def _fire(self, user_id_str: str):
+        user_id = int(user_id_str)
+        if self.tenant.block_manager.unblock_user(user_id):
+            logger.info("[%s] Срок блокировки пользователя %s истек", self.tenant.name, user_id)
+            self.tenant.notifier.notify(
+                user_id, "✅ Срок вашей блокировки истек, вы снова можете отправлять сообщения."
+            )
+
+# Фоновые уведомления пользователям с ограничением частоты
+class Notifier:
+    def __init__(self, tenant: "Tenant", rate: float = NOTIFY_RATE):
+        self.tenant = tenant
+        self.rate = rate
+        self._queue = asyncio.Queue()
+        self._task = None
+    
+    def notify(self, user_id: int, text: str):
+        """Постановка уведомления в очередь"""
+        self._queue.put_nowait((user_id, text))
+    
+    async def start(self):
+        """Запуск отправки уведомлений"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка отправки уведомлений"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def _run(self):
+        limiter = RateLimiter(self.rate)
+        while True:
+            user_id, text = await self._queue.get()
+            await limiter.acquire()
+            try:
+                await self.tenant.bot.send_message(user_id, text)
+            except Exception as e:
+                logger.error("Не удалось уведомить пользователя %s: %s", user_id, e)
+
+# Ограничение частоты запросов (token bucket)
+class RateLimiter:
+    def __init__(self, rate: float, burst: int = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+    
+    async def acquire(self):
+        """Ожидание свободного токена"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Защита исходящих запросов: кеш недоступных чатов и размыкатели по чатам
+class DeliveryGuard:
+    def __init__(self, filename: str, probe_interval: float = DEAD_CHAT_PROBE_INTERVAL,
+                 failures: int = CIRCUIT_FAILURES, cooldown: float = CIRCUIT_COOLDOWN):
+        self.filename = filename
+        self.probe_interval = probe_interval
+        self.failures = failures
+        self.cooldown = cooldown
+        self.dead_chats = self.load_dead()  # chat_id_str -> {"reason", "since", "probe_at"}
+        self._circuits = {}  # chat_id -> [сбоев подряд, разомкнута до]
+        self.stats = Counter()
+    
+    def load_dead(self) -> dict:
+        """Загрузка недоступных чатов"""
+        if os.path.exists(self.filename):
+            try:
+                with open(self.filename, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception:
+                return {}
+        return {}
+    
+    def save_dead(self):
+        """Сохранение недоступных чатов"""
+        try:
+            write_json(self.filename, self.dead_chats)
+        except Exception as e:
+            logger.error("Ошибка сохранения недоступных чатов: %s", e)
+    
+    def check(self, chat_id: int) -> str:
+        """Почему не отправлять запрос в чат: "dead", "circuit" или None.
+
+        Недоступный чат раз в probe_interval пропускает один запрос как пробу:
+        если он пройдет, чат вернется в строй.
+        """
+        now = time.time()
+        dead = self.dead_chats.get(str(chat_id))
+        if dead is not None:
+            if dead["probe_at"] > now:
+                self.stats["avoided_dead"] += 1
+                return "dead"
+            dead["probe_at"] = now + self.probe_interval
+            self.stats["probes"] += 1
+        circuit = self._circuits.get(chat_id)
+        if circuit is not None and circuit[1] > now:
+            self.stats["avoided_circuit"] += 1
+            return "circuit"
+        return None
+    
+    def success(self, chat_id: int):
+        """Успешный запрос: чат доступен, цепь замкнута"""
+        self._circuits.pop(chat_id, None)
+        if str(chat_id) in self.dead_chats:
+            self.revive(chat_id)
+    
+    def revive(self, chat_id: int):
+        """Чат снова доступен (проба прошла или пользователь написал боту)"""
+        if self.dead_chats.pop(str(chat_id), None) is not None:
+            self.stats["revived"] += 1
+            self.save_dead()
+    
+    def mark_dead(self, chat_id: int, reason: str):
+        """Telegram ответил, что чат недоступен боту"""
+        self._circuits.pop(chat_id, None)
+        self.dead_chats[str(chat_id)] = {
+            "reason": reason,
+            "since": self.dead_chats.get(str(chat_id), {}).get("since") or datetime.now().isoformat(),
+            "probe_at": time.time() + self.probe_interval
+        }
+        self.save_dead()
+    
+    def failure(self, chat_id: int):
+        """Временный сбой после всех повторов: после failures подряд цепь размыкается"""
+        circuit = self._circuits.setdefault(chat_id, [0, 0.0])
+        circuit[0] += 1
+        if circuit[0] >= self.failures:
+            circuit[1] = time.time() + self.cooldown
+            self.stats["circuit_opened"] += 1
+    
+    def open_circuits(self) -> int:
+        now = time.time()
+        return sum(1 for _, open_until in self._circuits.values() if open_until > now)
+
+# Бот-арендатор: свой токен, админы, файлы данных и лимиты
+class Tenant:
+    def __init__(self, name: str, token: str, admin_ids: list, data_dir: str = ".",
+                 session: AiohttpSession = None, rate_limit: float = TENANT_RATE_LIMIT,
+                 channel_id: int = CHANNEL_ID, publish_slots: list = PUBLISH_SLOTS,
+                 publish_spacing: float = PUBLISH_SPACING):
+        self.name = name
+        # Множество заменяется целиком при перезагрузке конфигурации, а не изменяется на месте
+        self.admin_ids = frozenset(admin_ids)
+        self.data_dir = data_dir
+        self.channel_id = channel_id
+        self.publish_slots = list(publish_slots)
+        self.publish_spacing = publish_spacing
+        os.makedirs(data_dir, exist_ok=True)
+        self.bot = Bot(token=token, session=session)
+        self.rate_limiter = RateLimiter(rate_limit)
+        self.delivery_guard = DeliveryGuard(self.path(DEAD_CHATS_FILE))
+        self.block_manager = BlockManager(self.path(BLOCKED_FILE))
+        self.post_logger = PostLogger(self.path(POSTS_LOG))
+        self.post_stats = PostStats(self.path(POST_STATS_FILE))
+        if not self.post_stats.ts and self.post_logger.logs:
+            self.post_stats.backfill(self.post_logger.logs)
+        self.user_manager = UserManager(self.path(USERS_LOG))
+        self.post_queue = PostQueue(self.path(POST_QUEUE_DIR), self)
+        self.content_filter = ContentFilter(self.path(BANNED_WORDS_FILE), self.path(HELD_POSTS_FILE))
+        self.scheduler = PublicationScheduler(self.path(SCHEDULE_FILE), self)
+        self.reply_index = ReplyIndex(self.path(REPLY_INDEX_FILE))
+        self.processed_updates = UpdateDeduplicator(self.path(UPDATE_STATE_FILE))
+        self.notifier = Notifier(self)
+        self.ban_expiry = BanExpiryScheduler(self)
+        self.peers = None  # Запросы к другим воркерам (только в шардированном режиме)
+    
+    def path(self, filename: str) -> str:
+        """Путь к файлу данных арендатора"""
+        return os.path.join(self.data_dir, filename)
+    
+    def apply_config(self, config: dict) -> list:
+        """Применение изменяемых на лету настроек; возвращает имена измененных.
+
+        Выполняется без await, поэтому обработчики видят либо старые, либо новые
+        настройки целиком. Токен и каталог данных меняются только перезапуском.
+        """
+        validate_tenant_configs([config])
+        changed = []
+        admin_ids = frozenset(config.get("admin_ids", []))
+        if admin_ids != self.admin_ids:
+            self.admin_ids = admin_ids
+            changed.append("admin_ids")
+        rate_limit = config.get("rate_limit", TENANT_RATE_LIMIT)
+        if rate_limit != self.rate_limiter.rate:
+            self.rate_limiter.rate = rate_limit
+            self.rate_limiter.capacity = max(1, int(rate_limit))
+            changed.append("rate_limit")
+        for key, default in (("channel_id", CHANNEL_ID), ("publish_slots", PUBLISH_SLOTS),
+                             ("publish_spacing", PUBLISH_SPACING)):
+            value = config.get(key, default)
+            if value != getattr(self, key):
+                setattr(self, key, list(value) if key == "publish_slots" else value)
+                changed.append(key)
+        return changed
+
+def load_tenant_configs() -> list:
+    """Загрузка конфигураций ботов: из TENANTS_FILE или одного бота из BOT_TOKEN/ADMIN_IDS.
+
+    Формат TENANTS_FILE: [{"name": "...", "token": "...", "admin_ids": [...],
+    "data_dir": "...", "rate_limit": 25, "channel_id": -100..., "publish_slots": ["09:00"],
+    "publish_spacing": 3600}, ...]
+    """
+    if os.path.exists(TENANTS_FILE):
+        with open(TENANTS_FILE, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    elif BOT_TOKEN and ADMIN_IDS:
+        configs = [{"name": "default", "token": BOT_TOKEN, "admin_ids": ADMIN_IDS, "data_dir": "."}]
+    elif BOT_TOKEN:
+        raise SystemExit("Администраторы не заданы: укажите ADMIN_IDS")
+    else:
+        raise SystemExit(f"Токен бота не задан: укажите BOT_TOKEN или создайте {TENANTS_FILE}")
+    validate_tenant_configs(configs)
+    return configs
+
+def validate_tenant_configs(configs) -> dict:
+    """Проверка конфигураций перед применением: bot_id -> конфигурация"""
+    if not isinstance(configs, list):
+        raise ValueError("ожидается список ботов")
+    def is_number(value) -> bool:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    
+    result = {}
+    for config in configs:
+        if not isinstance(config, dict):
+            raise ValueError("конфигурация бота должна быть объектом")
+        token = config.get("token")
+        if not isinstance(token, str) or not re.fullmatch(r"\d+:[\w-]+", token):
+            raise ValueError("у бота не задан корректный token")
+        bot_id = int(token.split(":")[0])
+        if bot_id in result:
+            raise ValueError(f"бот {bot_id} указан несколько раз")
+        admin_ids = config.get("admin_ids", [])
+        if not isinstance(admin_ids, list) or not all(
+            isinstance(admin_id, int) and not isinstance(admin_id, bool) for admin_id in admin_ids
+        ):
+            raise ValueError(f"admin_ids бота {bot_id} должен быть списком чисел")
+        rate_limit = config.get("rate_limit", TENANT_RATE_LIMIT)
+        if not is_number(rate_limit) or rate_limit <= 0:
+            raise ValueError(f"rate_limit бота {bot_id} должен быть положительным числом")
+        publish_spacing = config.get("publish_spacing", PUBLISH_SPACING)
+        if not is_number(publish_spacing) or publish_spacing < 0:
+            raise ValueError(f"publish_spacing бота {bot_id} должен быть неотрицательным числом")
+        channel_id = config.get("channel_id", CHANNEL_ID)
+        if channel_id is not None and (not isinstance(channel_id, int) or isinstance(channel_id, bool)):
+            raise ValueError(f"channel_id бота {bot_id} должен быть числом")
+        publish_slots = config.get("publish_slots", [])
+        if not isinstance(publish_slots, list):
+            raise ValueError(f"publish_slots бота {bot_id} должен быть списком")
+        for slot in publish_slots:
+            try:
+                datetime.strptime(slot, "%H:%M")
+            except (TypeError, ValueError):
+                raise ValueError(f"слот публикации бота {bot_id} должен иметь вид ЧЧ:ММ: {slot!r}") from None
+        result[bot_id] = config
+    return result
+
+def apply_tenant_configs(configs: list):
+    """Применение новой конфигурации к запущенным арендаторам"""
+    by_bot_id = validate_tenant_configs(configs)
+    # Проверено все; дальше только присваивания без await
+    for bot_id, tenant in tenants.items():
+        config = by_bot_id.get(bot_id)
+        if config is None:
+            logger.warning("[%s] Бот удален из конфигурации, изменения вступят в силу после перезапуска", tenant.name)
+            continue
+        changed = tenant.apply_config(config)
+        if changed:
+            logger.info("[%s] Конфигурация обновлена: %s", tenant.name, ", ".join(changed))
+    for bot_id in by_bot_id.keys() - tenants.keys():
+        logger.warning("Новый бот %s будет запущен после перезапуска", bot_id)
+
+# Отслеживание изменений файла конфигурации
+class ConfigWatcher:
+    def __init__(self, filename: str, apply: Callable[[list], None], interval: float = CONFIG_POLL_INTERVAL):
+        self.filename = filename
+        self.apply = apply
+        self.interval = interval
+        self._task = None
+        self._stamp = self.stamp()
+    
+    def stamp(self) -> tuple:
+        try:
+            stat = os.stat(self.filename)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def read(self) -> list:
+        with open(self.filename, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    async def start(self):
+        """Запуск отслеживания"""
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Остановка отслеживания"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+    
+    async def reload(self):
+        """Чтение и применение файла; при ошибке остается прежняя конфигурация"""
+        loop = asyncio.get_running_loop()
+        try:
+            configs = await loop.run_in_executor(None, self.read)
+            self.apply(configs)
+        except Exception as e:
+            logger.error("Конфигурация %s не применена: %s", self.filename, e)
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            stamp = self.stamp()
+            if stamp is None or stamp == self._stamp:
+                continue
+            self._stamp = stamp
+            await self.reload()
+
+def create_tenants(configs: list, session: AiohttpSession) -> dict:
+    """Создание арендаторов с общей HTTP-сессией"""
+    result = {}
+    for config in configs:
+        tenant = Tenant(
+            name=config.get("name") or config["token"].split(":")[0],
+            token=config["token"],
+            admin_ids=config.get("admin_ids", []),
+            data_dir=config.get("data_dir") or config.get("name") or ".",
+            session=session,
+            rate_limit=config.get("rate_limit", TENANT_RATE_LIMIT),
+            channel_id=config.get("channel_id", CHANNEL_ID),
+            publish_slots=config.get("publish_slots", PUBLISH_SLOTS),
+            publish_spacing=config.get("publish_spacing", PUBLISH_SPACING)
+        )
+        result[tenant.bot.id] = tenant
+    return result
+
+class TenantMiddleware(BaseMiddleware):
+    """Внешний middleware: арендатор бота, получившего апдейт"""
+    
+    async def __call__(self, handler, event, data: dict):
+        tenant = tenants.get(data["bot"].id)
+        if tenant is None:
+            return None
+        data["tenant"] = tenant
+        return await handler(event, data)
+
+class TenantRateLimitMiddleware(BaseRequestMiddleware):
+    """Middleware HTTP-сессии: лимит запросов к Bot API для каждого бота"""
+    
+    async def __call__(self, make_request, bot: Bot, method):
+        tenant = tenants.get(bot.id)
+        if tenant is not None:
+            await tenant.rate_limiter.acquire()
+        return await make_request(bot, method)
+
+class DeliveryGuardMiddleware(BaseRequestMiddleware):
+    """Middleware HTTP-сессии: не ходит в недоступные чаты и повторяет запросы при сетевых сбоях.
+
+    Запрос в недоступный чат завершается TelegramForbiddenError, а в чат с
+    разомкнутой цепью - TelegramNetworkError, без обращения к Bot API: вызывающий
+    код обрабатывает их так же, как настоящие ответы Telegram. Недоступными
+    считаются только личные чаты, где пользователь заблокировал бота или удалил
+    аккаунт; ошибки прав в группах и каналах не кешируются.
+    """
+    
+    DEAD_CHAT_ERRORS = ("bot was blocked by the user", "user is deactivated")
+    
+    async def __call__(self, make_request, bot: Bot, method):
+        tenant = tenants.get(bot.id)
+        if tenant is None or type(method).__name__ == "GetUpdates":
+            return await make_request(bot, method)
+        
+        guard = tenant.delivery_guard
+        chat_id = getattr(method, "chat_id", None)
+        if not isinstance(chat_id, int):
+            chat_id = None
+        if chat_id is not None:
+            skip = guard.check(chat_id)
+            if skip == "dead":
+                reason = guard.dead_chats[str(chat_id)]["reason"]
+                raise TelegramForbiddenError(method, f"{reason} (запрос не отправлен)")
+            if skip == "circuit":
+                raise TelegramNetworkError(method, "цепь разомкнута после сбоев (запрос не отправлен)")
+        
+        for attempt in itertools.count():
+            try:
+                result = await make_request(bot, method)
+            except TelegramForbiddenError as e:
+                # Личные чаты имеют положительный ID
+                if chat_id is not None and chat_id > 0 and any(
+                    error in e.message.lower() for error in self.DEAD_CHAT_ERRORS
+                ):
+                    guard.mark_dead(chat_id, e.message)
+                raise
+            except (TelegramNetworkError, TelegramServerError) as e:
+                if attempt >= TRANSIENT_RETRIES:
+                    if chat_id is not None:
+                        guard.failure(chat_id)
+                    raise
+                # Экспоненциальная задержка с полным джиттером
+                guard.stats["retries"] += 1
+                delay = random.uniform(0, TRANSIENT_RETRY_BASE * 2 ** attempt)
+                logger.warning("Сбой %s (%s), повтор через %.2f сек.", type(method).__name__, e, delay)
+                await asyncio.sleep(delay)
+                continue
+            if chat_id is not None:
+                guard.success(chat_id)
+            return result
+
+def create_http_session() -> AiohttpSession:
+    """Общая HTTP-сессия ботов: пул соединений с keep-alive к api.telegram.org"""
+    session = AiohttpSession(limit=HTTP_POOL_LIMIT)
+    # Все запросы идут на один хост; держим соединения открытыми между запросами
+    session._connector_init.update(
+        limit_per_host=HTTP_POOL_LIMIT, keepalive_timeout=HTTP_KEEPALIVE, enable_cleanup_closed=True
+    )
+    # Сначала проверка чата, чтобы пропущенные запросы не расходовали лимит
+    session.middleware(DeliveryGuardMiddleware())
+    session.middleware(TenantRateLimitMiddleware())
+    return session
+
+class IsAdmin(Filter):
+    """Фильтр: отправитель - администратор своего бота"""
+    
+    async def __call__(self, event, tenant: Tenant) -> bool:
+        return event.from_user.id in tenant.admin_ids
+
 # Инициализация менеджеров
-block_manager = BlockManager(BLOCKED_FILE)
-post_logger = PostLogger(POSTS_LOG)
-user_manager = UserManager(USERS_LOG)
+http_session = create_http_session()
+tenants = {}  # bot_id -> Tenant
+update_executor = KeyedSerialExecutor(UPDATE_CONCURRENCY)
+dp.update.outer_middleware(TenantMiddleware())
+dp.update.outer_middleware(ReviveChatMiddleware())
+dp.update.outer_middleware(LogContextMiddleware())
+dp.update.outer_middleware(DeduplicateUpdateMiddleware())
+dp.update.outer_middleware(PostIntakeMiddleware())
+dp.update.outer_middleware(SerialUpdateMiddleware(update_executor))
+# FSM-состояние должно читаться уже внутри очереди пользователя
+dp.update.outer_middleware.unregister(dp.fsm)
+dp.update.outer_middleware(dp.fsm)
+dp.message.middleware(HandlerNameMiddleware())
+dp.callback_query.middleware(HandlerNameMiddleware())
+runtime_profiler = RuntimeProfiler()
 
-# Хранилище для сообщений, ожидающих ответа
-reply_storage = {}
+async def send_post_to_admins(tenant: Tenant, message: Message, user: types.User,
+                              admin_ids: list = None, tags: list = None, failed: dict = None) -> dict:
+    """Отправка поста администраторам в одном сообщении.
 
-async def send_post_to_admins(message: Message, user: types.User):
-    """Отправка поста администраторам в одном сообщении"""
+    Возвращает словарь {admin_id: message_id} для успешных доставок;
+    администраторы, которым отправить не удалось, в него не попадают,
+    а их последняя ошибка записывается в failed, если он передан.
+    """
+    if admin_ids is None:
+        admin_ids = tenant.admin_ids
     
     # Создаем подпись с информацией об отправителе
     sender_info = (
@@ -253,6 +1964,8 @@ async def send_post_to_admins(message: Message, user: types.User):
         f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}\n\n"
         f"📝 Сообщение:"
     )
+    if tags:
+        sender_info = f"🏷 Фильтр: {', '.join(tags)}\n\n{sender_info}"
     
     # Добавляем сообщение пользователя
     if message.text:
@@ -267,113 +1980,110 @@ async def send_post_to_admins(message: Message, user: types.User):
         text="💬 Ответить", 
         callback_data=f"reply_{user.id}"
     )
-    admin_kb = InlineKeyboardMarkup(inline_keyboard=[[reply_button]])
-    
-    # Логируем пост
-    post_data = {
-        "user_id": user.id,
-        "username": user.username,
-        "first_name": user.first_name,
-        "last_name": user.last_name,
-        "content": message.text or message.caption or "",
-        "media_type": message.content_type,
-        "timestamp": datetime.now().isoformat(),
-        "message_id": message.message_id,
-        "chat_id": message.chat.id
-    }
-    post_logger.add_post(post_data)
+    keyboard = [[reply_button]]
+    
+    # Кнопки модерации, если у бота настроен канал
+    if tenant.channel_id:
+        post_key = f"{message.chat.id}_{message.message_id}"
+        keyboard.append([
+            InlineKeyboardButton(text="✅ Одобрить", callback_data=f"pub_approve_{post_key}"),
+            InlineKeyboardButton(text="🕒 В расписание", callback_data=f"pub_schedule_{post_key}"),
+            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"pub_reject_{post_key}")
+        ])
+    admin_kb = InlineKeyboardMarkup(inline_keyboard=keyboard)
     
     # Отправляем админам в зависимости от типа контента
-    sent_messages = []
-    for admin_id in ADMIN_IDS:
+    sent_messages = {}
+    for admin_id in admin_ids:
         try:
             if message.text:
-                sent_msg = await bot.send_message(
+                sent_msg = await tenant.bot.send_message(
                     admin_id,
                     full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             elif message.photo:
-                sent_msg = await bot.send_photo(
+                sent_msg = await tenant.bot.send_photo(
                     admin_id,
                     message.photo[-1].file_id,
                     caption=full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             elif message.video:
-                sent_msg = await bot.send_video(
+                sent_msg = await tenant.bot.send_video(
                     admin_id,
                     message.video.file_id,
                     caption=full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             elif message.document:
-                sent_msg = await bot.send_document(
+                sent_msg = await tenant.bot.send_document(
                     admin_id,
                     message.document.file_id,
                     caption=full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             elif message.voice:
                 # Для голосовых сначала отправляем текст, потом голосовое
-                sent_msg = await bot.send_message(
+                sent_msg = await tenant.bot.send_message(
                     admin_id,
                     full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
-                await bot.send_voice(admin_id, message.voice.file_id)
+                sent_messages[admin_id] = sent_msg.message_id
+                await tenant.bot.send_voice(admin_id, message.voice.file_id)
             elif message.audio:
-                sent_msg = await bot.send_audio(
+                sent_msg = await tenant.bot.send_audio(
                     admin_id,
                     message.audio.file_id,
                     caption=full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             elif message.sticker:
                 # Для стикеров сначала отправляем информацию, потом стикер
-                sent_msg = await bot.send_message(
+                sent_msg = await tenant.bot.send_message(
                     admin_id,
                     full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
-                await bot.send_sticker(admin_id, message.sticker.file_id)
+                sent_messages[admin_id] = sent_msg.message_id
+                await tenant.bot.send_sticker(admin_id, message.sticker.file_id)
             else:
                 # Для других типов сообщений
-                sent_msg = await bot.send_message(
+                sent_msg = await tenant.bot.send_message(
                     admin_id,
                     full_text,
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
                 
         except Exception as e:
-            logger.error(f"Ошибка отправки админу {admin_id}: {e}")
+            logger.error("Ошибка отправки админу %s: %s", admin_id, e)
             # Попробуем отправить простым текстом в случае ошибки
             try:
-                sent_msg = await bot.send_message(
+                sent_msg = await tenant.bot.send_message(
                     admin_id,
                     f"{sender_info}\n\n⚠️ Не удалось отправить медиа. Тип: {message.content_type}",
                     reply_markup=admin_kb
                 )
-                sent_messages.append(sent_msg.message_id)
+                sent_messages[admin_id] = sent_msg.message_id
             except Exception as e2:
-                logger.error(f"Не удалось отправить даже текст админу {admin_id}: {e2}")
+                logger.error("Не удалось отправить даже текст админу %s: %s", admin_id, e2)
+                if failed is not None:
+                    failed[admin_id] = e2
     
-    # Сохраняем информацию о сообщении для возможного ответа
-    reply_storage[str(user.id)] = {
-        "user_id": user.id,
-        "message_ids": sent_messages,
-        "timestamp": datetime.now().isoformat()
-    }
+    # Запоминаем, кому отвечать на эти сообщения обычным ответом
+    for admin_id, message_id in sent_messages.items():
+        tenant.reply_index.put(admin_id, message_id, user.id)
+    
+    return sent_messages
 
-async def send_reply_to_user(user_id: int, message: Message, admin_user: types.User):
+async def send_reply_to_user(tenant: Tenant, user_id: int, message: Message, admin_user: types.User):
     """Отправка ответа пользователю - только "Ответ от администратора" и сообщение"""
     
     # Формируем только надпись и сообщение
@@ -393,14 +2103,14 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
     
     try:
         if message.text:
-            await bot.send_message(
+            await tenant.bot.send_message(
                 user_id,
                 full_text,
                 reply_markup=reply_kb
             )
             return True
         elif message.photo:
-            await bot.send_photo(
+            await tenant.bot.send_photo(
                 user_id,
                 message.photo[-1].file_id,
                 caption=full_text,
@@ -408,7 +2118,7 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
             )
             return True
         elif message.video:
-            await bot.send_video(
+            await tenant.bot.send_video(
                 user_id,
                 message.video.file_id,
                 caption=full_text,
@@ -416,7 +2126,7 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
             )
             return True
         elif message.document:
-            await bot.send_document(
+            await tenant.bot.send_document(
                 user_id,
                 message.document.file_id,
                 caption=full_text,
@@ -425,15 +2135,15 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
             return True
         elif message.voice:
             # Для голосовых сначала текст, потом голосовое
-            await bot.send_message(
+            await tenant.bot.send_message(
                 user_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            await bot.send_voice(user_id, message.voice.file_id)
+            await tenant.bot.send_voice(user_id, message.voice.file_id)
             return True
         elif message.audio:
-            await bot.send_audio(
+            await tenant.bot.send_audio(
                 user_id,
                 message.audio.file_id,
                 caption=full_text,
@@ -442,15 +2152,15 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
             return True
         elif message.sticker:
             # Для стикеров сначала информация, потом стикер
-            await bot.send_message(
+            await tenant.bot.send_message(
                 user_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            await bot.send_sticker(user_id, message.sticker.file_id)
+            await tenant.bot.send_sticker(user_id, message.sticker.file_id)
             return True
         else:
-            await bot.send_message(
+            await tenant.bot.send_message(
                 user_id,
                 full_text,
                 reply_markup=reply_kb
@@ -458,10 +2168,10 @@ async def send_reply_to_user(user_id: int, message: Message, admin_user: types.U
             return True
         
     except Exception as e:
-        logger.error(f"Ошибка отправки ответа пользователю {user_id}: {e}")
+        logger.error("Ошибка отправки ответа пользователю %s: %s", user_id, e)
         return False
 
-async def send_reply_to_admin(admin_id: int, message: Message, user: types.User):
+async def send_reply_to_admin(tenant: Tenant, admin_id: int, message: Message, user: types.User):
     """Отправка ответа администратору - с полной информацией о пользователе"""
     
     # Формируем информацию о пользователе
@@ -493,87 +2203,131 @@ async def send_reply_to_admin(admin_id: int, message: Message, user: types.User)
     
     try:
         if message.text:
-            await bot.send_message(
+            sent_msg = await tenant.bot.send_message(
                 admin_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            return True
         elif message.photo:
-            await bot.send_photo(
+            sent_msg = await tenant.bot.send_photo(
                 admin_id,
                 message.photo[-1].file_id,
                 caption=full_text,
                 reply_markup=reply_kb
             )
-            return True
         elif message.video:
-            await bot.send_video(
+            sent_msg = await tenant.bot.send_video(
                 admin_id,
                 message.video.file_id,
                 caption=full_text,
                 reply_markup=reply_kb
             )
-            return True
         elif message.document:
-            await bot.send_document(
+            sent_msg = await tenant.bot.send_document(
                 admin_id,
                 message.document.file_id,
                 caption=full_text,
                 reply_markup=reply_kb
             )
-            return True
         elif message.voice:
-            await bot.send_message(
+            sent_msg = await tenant.bot.send_message(
                 admin_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            await bot.send_voice(admin_id, message.voice.file_id)
-            return True
+            await tenant.bot.send_voice(admin_id, message.voice.file_id)
         elif message.audio:
-            await bot.send_audio(
+            sent_msg = await tenant.bot.send_audio(
                 admin_id,
                 message.audio.file_id,
                 caption=full_text,
                 reply_markup=reply_kb
             )
-            return True
         elif message.sticker:
-            await bot.send_message(
+            sent_msg = await tenant.bot.send_message(
                 admin_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            await bot.send_sticker(admin_id, message.sticker.file_id)
-            return True
+            await tenant.bot.send_sticker(admin_id, message.sticker.file_id)
         else:
-            await bot.send_message(
+            sent_msg = await tenant.bot.send_message(
                 admin_id,
                 full_text,
                 reply_markup=reply_kb
             )
-            return True
+        
+        # Админ может ответить пользователю обычным ответом на это сообщение
+        tenant.reply_index.put(admin_id, sent_msg.message_id, user.id)
+        return True
         
     except Exception as e:
-        logger.error(f"Ошибка отправки ответа администратору {admin_id}: {e}")
+        logger.error("Ошибка отправки ответа администратору %s: %s", admin_id, e)
         return False
 
+async def accept_post(tenant: Tenant, message: Message, user: types.User):
+    """Проверка фильтром, постановка поста в очередь доставки и подтверждение пользователю"""
+    action, words = tenant.content_filter.check(message)
+    
+    if action == "reject":
+        await message.answer("❌ Пост отклонен: он содержит запрещенные слова или ссылки.")
+        return
+    
+    if action == "hold":
+        held_id = tenant.content_filter.hold_post(message, user, words)
+        held_kb = InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="✅ Пропустить", callback_data=f"held_release_{held_id}"),
+            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"held_reject_{held_id}")
+        ]])
+        held_text = (
+            f"⏸ Пост задержан фильтром\n\n"
+            f"🆔 ID: {user.id}\n"
+            f"🏷 Слова: {', '.join(words)}"
+        )
+        if message.text:
+            # Запас под отметку о решении, которую допишет held_post_callback
+            held_text = f"{held_text}\n\n📝 Сообщение:\n\n{message.text}"[:4000]
+        for admin_id in tenant.admin_ids:
+            try:
+                # Медиа показываем копией поста, кнопки - в ответе на нее
+                reply_to = None
+                if not message.text:
+                    copied = await tenant.bot.copy_message(admin_id, message.chat.id, message.message_id)
+                    reply_to = copied.message_id
+                await tenant.bot.send_message(
+                    admin_id,
+                    held_text,
+                    reply_markup=held_kb,
+                    reply_to_message_id=reply_to
+                )
+            except Exception as e:
+                logger.error("Ошибка отправки админу %s: %s", admin_id, e)
+        await message.answer("✅ Ваш пост отправлен администраторам анонимно!")
+        return
+    
+    delayed = tenant.post_queue.put(message, user, tags=words)
+    if delayed:
+        await message.answer(
+            "⏳ Ваш пост принят, но из-за высокой нагрузки доставка администраторам задерживается."
+        )
+    else:
+        await message.answer("✅ Ваш пост отправлен администраторам анонимно!")
+
 # Команда /start
 @dp.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, tenant: Tenant):
     user_id = message.from_user.id
     user = message.from_user
     
     # Добавляем пользователя в базу
-    user_manager.add_user(
+    tenant.user_manager.add_user(
         user_id=user_id,
         username=user.username,
         first_name=user.first_name,
         last_name=user.last_name
     )
     
-    if block_manager.is_blocked(user_id):
+    if tenant.block_manager.is_blocked(user_id):
         await message.answer("❌ Вы заблокированы и не можете отправлять сообщения.")
         return
     
@@ -586,17 +2340,17 @@ async def cmd_start(message: Message):
     )
     
     # Для администраторов добавляем информацию о панели
-    if user_id in ADMIN_IDS:
+    if user_id in tenant.admin_ids:
         welcome_text += "\n\n👑 Вы администратор. Используйте /panell для открытия панели управления."
     
     await message.answer(welcome_text)
 
 # Команда /panell - Панель администратора
 @dp.message(Command("panell"))
-async def admin_panel_command(message: Message):
+async def admin_panel_command(message: Message, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         await message.answer("⛔ У вас нет прав администратора.")
         return
     
@@ -605,7 +2359,7 @@ async def admin_panel_command(message: Message):
         keyboard=[
             [KeyboardButton(text="🚫 Заблокировать пользователя")],
             [KeyboardButton(text="✅ Разблокировать пользователя")],
-            [KeyboardButton(text="📊 Статистика")],
+            [KeyboardButton(text="📊 Статистика"), KeyboardButton(text="📈 Аналитика")],
             [KeyboardButton(text="✖️ Закрыть меню")]
         ],
         resize_keyboard=True,
@@ -616,10 +2370,10 @@ async def admin_panel_command(message: Message):
 
 # Команда /closee - Закрыть меню админа
 @dp.message(Command("closee"))
-async def close_admin_menu(message: Message, state: FSMContext):
+async def close_admin_menu(message: Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         await message.answer("⛔ У вас нет прав администратора.")
         return
     
@@ -633,12 +2387,137 @@ async def close_admin_menu(message: Message, state: FSMContext):
     remove_kb = types.ReplyKeyboardRemove()
     await message.answer("✅ Меню администратора закрыто", reply_markup=remove_kb)
 
+# Команда /profile N - Профилирование на N секунд (/profile stop - остановить)
+@dp.message(Command("profile"))
+async def profile_command(message: Message, command: CommandObject, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in OPERATOR_IDS:
+        await message.answer("⛔ Команда доступна только операторам сервиса.")
+        return
+    
+    arg = (command.args or "30").strip()
+    
+    if arg == "stop":
+        if runtime_profiler.stop_profile():
+            await message.answer("⏹ Профилирование остановлено, отчет будет отправлен.")
+        else:
+            await message.answer("ℹ️ Профилирование не запущено.")
+        return
+    
+    if runtime_profiler.is_profiling:
+        await message.answer("⚠️ Профилирование уже запущено. Остановить: /profile stop")
+        return
+    
+    try:
+        seconds = int(arg)
+    except ValueError:
+        await message.answer("⚠️ Использование: /profile <секунды> или /profile stop")
+        return
+    seconds = max(1, min(seconds, PROFILE_MAX_SECONDS))
+    
+    async def send_report(report: str):
+        await tenant.bot.send_document(
+            user_id,
+            BufferedInputFile(report.encode("utf-8"), filename=f"profile_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+            caption="📈 Отчет профилировщика"
+        )
+    
+    runtime_profiler.start_profile(seconds, send_report)
+    await message.answer(f"⏱ Профилирование запущено на {seconds} сек.")
+
+# Команда /memsnap - Снимок памяти (/memsnap stop - выключить tracemalloc)
+@dp.message(Command("memsnap"))
+async def memsnap_command(message: Message, command: CommandObject, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in OPERATOR_IDS:
+        await message.answer("⛔ Команда доступна только операторам сервиса.")
+        return
+    
+    if (command.args or "").strip() == "stop":
+        if runtime_profiler.stop_memory():
+            await message.answer("⏹ Отслеживание памяти выключено.")
+        else:
+            await message.answer("ℹ️ Отслеживание памяти не запущено.")
+        return
+    
+    report = runtime_profiler.memory_snapshot()
+    if report is None:
+        await message.answer(
+            "📸 Отслеживание памяти включено, базовый снимок сохранен.\n"
+            "Повторите /memsnap, чтобы получить разницу, или /memsnap stop для выключения."
+        )
+        return
+    
+    await message.answer_document(
+        BufferedInputFile(report.encode("utf-8"), filename=f"memsnap_{datetime.now():%Y%m%d_%H%M%S}.txt"),
+        caption="🧠 Снимок памяти относительно базы"
+    )
+
+# Команда /banword [tag|hold|reject] слово - Добавить запрещенное слово
+@dp.message(Command("banword"))
+async def banword_command(message: Message, command: CommandObject, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in tenant.admin_ids:
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+    
+    action, _, word = (command.args or "").strip().partition(" ")
+    if action not in ContentFilter.ACTIONS:
+        action, word = "hold", (command.args or "").strip()
+    word = word.strip()
+    
+    if not word:
+        await message.answer(
+            "⚠️ Использование: /banword [tag|hold|reject] слово\n\n"
+            "tag - пометить пост, hold - задержать до решения админа, reject - отклонить"
+        )
+        return
+    
+    await tenant.content_filter.add_word(word, action)
+    await message.answer(f"✅ Слово добавлено в фильтр: {word} ({action})")
+
+# Команда /unbanword слово - Удалить запрещенное слово
+@dp.message(Command("unbanword"))
+async def unbanword_command(message: Message, command: CommandObject, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in tenant.admin_ids:
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+    
+    word = (command.args or "").strip()
+    if await tenant.content_filter.remove_word(word):
+        await message.answer(f"✅ Слово удалено из фильтра: {word}")
+    else:
+        await message.answer("❌ Такого слова нет в фильтре.")
+
+# Команда /banwords - Список запрещенных слов
+@dp.message(Command("banwords"))
+async def banwords_command(message: Message, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in tenant.admin_ids:
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+    
+    words = tenant.content_filter.words
+    if not words:
+        await message.answer("✅ Фильтр пуст.")
+        return
+    
+    text = f"🚫 Запрещенные слова ({len(words)}):\n\n"
+    text += "\n".join(f"• {word} - {action}" for word, action in sorted(words.items()))
+    await message.answer(text[:4096])
+
 # Обработка кнопок админ панели
 @dp.message(F.text == "✖️ Закрыть меню")
-async def close_menu_button(message: Message, state: FSMContext):
+async def close_menu_button(message: Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         return
     
     # Очищаем состояние ответа, если оно есть
@@ -653,10 +2532,10 @@ async def close_menu_button(message: Message, state: FSMContext):
 
 # Кнопка "Разблокировать пользователя"
 @dp.message(F.text == "✅ Разблокировать пользователя")
-async def unblock_user_button(message: Message, state: FSMContext):
+async def unblock_user_button(message: Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         return
     
     # Очищаем состояние ответа, если оно есть
@@ -665,7 +2544,7 @@ async def unblock_user_button(message: Message, state: FSMContext):
         await state.clear()
     
     # Получаем список заблокированных пользователей
-    blocked_list = block_manager.get_blocked_list()
+    blocked_list = tenant.block_manager.get_blocked_list()
     
     if not blocked_list:
         await message.answer("✅ Нет заблокированных пользователей.")
@@ -679,7 +2558,7 @@ async def unblock_user_button(message: Message, state: FSMContext):
         reason = user.get('reason', 'Причина не указана')
         text += f"🆔 {user['user_id']} - 👤 {name or 'Без имени'}\n"
         text += f"   📝 Причина: {reason}\n"
-        text += f"   🕒 Заблокирован: {blocked_at}\n\n"
+        text += f"   🕒 Заблокирован: {blocked_at} ({format_expiry(user)})\n\n"
     
     text += "📝 Отправьте ID пользователя для разблокировки:"
     
@@ -688,8 +2567,8 @@ async def unblock_user_button(message: Message, state: FSMContext):
 
 # Обработка ID для разблокировки
 @dp.message(AdminStates.waiting_for_unblock_user)
-async def handle_unblock_user_id(message: Message, state: FSMContext):
-    if message.from_user.id not in ADMIN_IDS:
+async def handle_unblock_user_id(message: Message, state: FSMContext, tenant: Tenant):
+    if message.from_user.id not in tenant.admin_ids:
         await state.clear()
         return
     
@@ -697,12 +2576,12 @@ async def handle_unblock_user_id(message: Message, state: FSMContext):
         user_id_to_unblock = int(message.text.strip())
         
         # Получаем информацию о пользователе
-        blocked_list = block_manager.get_blocked_list()
+        blocked_list = tenant.block_manager.get_blocked_list()
         user_info = next((u for u in blocked_list if u['user_id'] == user_id_to_unblock), None)
         
         if user_info:
             # Разблокируем пользователя
-            success = block_manager.unblock_user(user_id_to_unblock, admin_id=message.from_user.id)
+            success = tenant.block_manager.unblock_user(user_id_to_unblock, admin_id=message.from_user.id)
             
             if success:
                 name = f"{user_info['first_name'] or ''} {user_info['last_name'] or ''}".strip()
@@ -716,12 +2595,12 @@ async def handle_unblock_user_id(message: Message, state: FSMContext):
                 
                 # Пытаемся уведомить пользователя
                 try:
-                    await bot.send_message(
+                    await tenant.bot.send_message(
                         user_id_to_unblock,
                         "✅ Вы были разблокированы администратором."
                     )
                 except Exception as e:
-                    logger.error(f"Не удалось уведомить пользователя {user_id_to_unblock}: {e}")
+                    logger.error("Не удалось уведомить пользователя %s: %s", user_id_to_unblock, e)
             else:
                 await message.answer("❌ Пользователь не был заблокирован.")
         else:
@@ -734,10 +2613,10 @@ async def handle_unblock_user_id(message: Message, state: FSMContext):
 
 # Кнопка "Заблокировать пользователя"
 @dp.message(F.text == "🚫 Заблокировать пользователя")
-async def block_user_button(message: Message, state: FSMContext):
+async def block_user_button(message: Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         return
     
     # Очищаем состояние ответа, если оно есть
@@ -750,8 +2629,8 @@ async def block_user_button(message: Message, state: FSMContext):
 
 # Обработка ID для блокировки
 @dp.message(AdminStates.waiting_for_block_user)
-async def handle_block_user_id(message: Message, state: FSMContext):
-    if message.from_user.id not in ADMIN_IDS:
+async def handle_block_user_id(message: Message, state: FSMContext, tenant: Tenant):
+    if message.from_user.id not in tenant.admin_ids:
         await state.clear()
         return
     
@@ -759,19 +2638,19 @@ async def handle_block_user_id(message: Message, state: FSMContext):
         user_id_to_block = int(message.text.strip())
         
         # Проверяем, не пытаемся ли заблокировать админа
-        if user_id_to_block in ADMIN_IDS:
+        if user_id_to_block in tenant.admin_ids:
             await message.answer("❌ Нельзя заблокировать администратора.")
             await state.clear()
             return
         
         # Проверяем, не заблокирован ли уже пользователь
-        if block_manager.is_blocked(user_id_to_block):
+        if tenant.block_manager.is_blocked(user_id_to_block):
             await message.answer("⚠️ Этот пользователь уже заблокирован.")
             await state.clear()
             return
         
         # Сохраняем ID пользователя и запрашиваем причину
-        await state.update_data(block_user_id=user_id_to_block)
+        await state.update_data(block_user_id=user_id_to_block, block_admin_id=message.from_user.id)
         await message.answer("📝 Теперь отправьте причину блокировки:")
         await state.set_state(AdminStates.waiting_for_block_reason)
     
@@ -781,75 +2660,222 @@ async def handle_block_user_id(message: Message, state: FSMContext):
 
 # Обработка причины блокировки
 @dp.message(AdminStates.waiting_for_block_reason)
-async def handle_block_reason(message: Message, state: FSMContext):
-    if message.from_user.id not in ADMIN_IDS:
+async def handle_block_reason(message: Message, state: FSMContext, tenant: Tenant):
+    if message.from_user.id not in tenant.admin_ids:
         await state.clear()
         return
     
-    user_data = await state.get_data()
-    user_id_to_block = user_data.get('block_user_id')
-    reason = message.text.strip()
+    reason = (message.text or "").strip()
     
     if not reason:
         await message.answer("⚠️ Причина не может быть пустой. Попробуйте снова.")
         return
     
-    # Получаем информацию о пользователе
-    user_info = user_manager.get_user_info(user_id_to_block)
+    # Сохраняем причину и запрашиваем срок
+    await state.update_data(block_reason=reason)
+    keyboard = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=label, callback_data=f"blockdur_{seconds}") for label, seconds in BLOCK_DURATIONS],
+        [InlineKeyboardButton(text="♾ Навсегда", callback_data="blockdur_0")]
+    ])
+    await message.answer(
+        "⏳ Выберите срок блокировки или отправьте свой (например: 30m, 12h, 3d, 2w):",
+        reply_markup=keyboard
+    )
+    await state.set_state(AdminStates.waiting_for_block_duration)
+
+# Обработка срока блокировки, введенного вручную
+@dp.message(AdminStates.waiting_for_block_duration)
+async def handle_block_duration(message: Message, state: FSMContext, tenant: Tenant):
+    if message.from_user.id not in tenant.admin_ids:
+        await state.clear()
+        return
+    
+    duration = parse_duration(message.text or "")
+    if duration is None:
+        await message.answer("⚠️ Неверный формат срока. Примеры: 30m, 12h, 3d, 2w.")
+        return
+    
+    await block_user_from_state(message, state, tenant, duration)
+
+# Выбор срока блокировки кнопкой
+@dp.callback_query(F.data.startswith("blockdur_"))
+async def block_duration_callback(callback: CallbackQuery, state: FSMContext, tenant: Tenant):
+    if callback.from_user.id not in tenant.admin_ids:
+        await callback.answer("⛔ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    if await state.get_state() != AdminStates.waiting_for_block_duration:
+        await callback.answer("ℹ️ Блокировка уже выполнена или отменена.", show_alert=True)
+        return
+    
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await callback.answer()
+    await block_user_from_state(callback.message, state, tenant, int(callback.data.split("_", 1)[1]) or None)
+
+async def block_user_from_state(message: Message, state: FSMContext, tenant: Tenant, duration: int = None):
+    """Завершение мастера блокировки: ID и причина берутся из состояния"""
+    user_data = await state.get_data()
+    await state.clear()
+    user_id_to_block = user_data.get('block_user_id')
+    reason = user_data.get('block_reason', '')
+    
+    # Получаем информацию о пользователе (в шардированном режиме - у воркера-владельца)
+    user_info = (await find_users(tenant, [user_id_to_block])).get(user_id_to_block)
+    
+    # Блокируем пользователя, даже если его нет в базе
+    tenant.block_manager.block_user(
+        user_id=user_id_to_block,
+        username=(user_info or {}).get('username', ''),
+        first_name=(user_info or {}).get('first_name', ''),
+        last_name=(user_info or {}).get('last_name', ''),
+        admin_id=user_data.get('block_admin_id'),
+        reason=reason,
+        duration=duration
+    )
+    expiry = format_expiry(tenant.block_manager.blocked_users[str(user_id_to_block)])
     
     if user_info:
-        # Блокируем пользователя с указанием причины
-        block_manager.block_user(
-            user_id=user_id_to_block,
-            username=user_info.get('username', ''),
-            first_name=user_info.get('first_name', ''),
-            last_name=user_info.get('last_name', ''),
-            admin_id=message.from_user.id,
-            reason=reason
-        )
-        
         name = f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}".strip()
         await message.answer(
             f"✅ Пользователь успешно заблокирован:\n\n"
             f"🆔 ID: {user_id_to_block}\n"
             f"👤 Имя: {name or 'Без имени'}\n"
-            f"📝 Причина: {reason}"
+            f"📝 Причина: {reason}\n"
+            f"⏳ Срок: {expiry}"
         )
         
         # Пытаемся уведомить пользователя
         try:
-            await bot.send_message(
+            await tenant.bot.send_message(
                 user_id_to_block,
                 f"🚫 Вы были заблокированы администратором.\n"
-                f"📝 Причина: {reason}"
+                f"📝 Причина: {reason}\n"
+                f"⏳ Срок: {expiry}"
             )
         except Exception as e:
-            logger.error(f"Не удалось уведомить пользователя {user_id_to_block}: {e}")
+            logger.error("Не удалось уведомить пользователя %s: %s", user_id_to_block, e)
     else:
-        # Если пользователь не найден в базе, все равно блокируем
-        block_manager.block_user(
-            user_id=user_id_to_block,
-            username="",
-            first_name="",
-            last_name="",
-            admin_id=message.from_user.id,
-            reason=reason
-        )
         await message.answer(
             f"✅ Пользователь успешно заблокирован:\n\n"
             f"🆔 ID: {user_id_to_block}\n"
             f"📝 Причина: {reason}\n"
+            f"⏳ Срок: {expiry}\n"
             f"ℹ️ Пользователь не найден в базе данных"
         )
+
+# Команды /bulkblock [срок] причина и /bulkunblock - Массовая блокировка/разблокировка
+@dp.message(Command("bulkblock", "bulkunblock"))
+async def bulk_block_command(message: Message, command: CommandObject, state: FSMContext, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in tenant.admin_ids:
+        await message.answer("⛔ У вас нет прав администратора.")
+        return
+    
+    action = "block" if command.command == "bulkblock" else "unblock"
+    reason = (command.args or "").strip()
+    
+    # Необязательный срок первым словом: /bulkblock 7d спам
+    first, _, rest = reason.partition(" ")
+    duration = parse_duration(first) if action == "block" else None
+    if duration is not None:
+        reason = rest.strip()
+    
+    if action == "block" and not reason:
+        await message.answer("⚠️ Использование: /bulkblock [срок] причина")
+        return
+    
+    await state.set_state(AdminStates.waiting_for_bulk_ids)
+    await state.update_data(bulk_action=action, bulk_reason=reason, bulk_duration=duration)
+    await message.answer(
+        "📝 Отправьте список ID пользователей (через пробел, запятую или с новой строки) "
+        "или файл .txt/.csv со списком (в CSV ID берется из первой колонки)."
+    )
+
+def parse_bulk_ids(text: str, is_csv: bool = False) -> tuple:
+    """ID из списка для массовых операций: (ID без повторов, отброшенные токены).
+
+    В CSV ID берется из первой колонки, остальные колонки (причины, даты) не читаются;
+    иначе токены разделяются пробелами и запятыми. ID - только целое число.
+    """
+    if is_csv:
+        tokens = [row[0].strip() for row in csv.reader(io.StringIO(text)) if row and row[0].strip()]
+    else:
+        tokens = [token for token in re.split(r"[\s,]+", text) if token]
+    user_ids = list(dict.fromkeys(int(token) for token in tokens if token.isdecimal()))
+    rejected = list(dict.fromkeys(token for token in tokens if not token.isdecimal()))
+    return user_ids, rejected
+
+# Обработка списка ID для массовой блокировки/разблокировки
+@dp.message(AdminStates.waiting_for_bulk_ids)
+async def handle_bulk_ids(message: Message, state: FSMContext, tenant: Tenant):
+    if message.from_user.id not in tenant.admin_ids:
+        await state.clear()
+        return
     
+    state_data = await state.get_data()
     await state.clear()
+    
+    if message.document:
+        content = await tenant.bot.download(message.document)
+        text = content.read().decode("utf-8-sig", errors="ignore")
+    else:
+        text = message.text or message.caption or ""
+    
+    is_csv = bool(message.document) and (message.document.file_name or "").lower().endswith(".csv")
+    user_ids, rejected = parse_bulk_ids(text, is_csv)
+    skipped = ""
+    if rejected:
+        shown = ", ".join(token[:32] for token in rejected[:10])
+        more = f" и еще {len(rejected) - 10}" if len(rejected) > 10 else ""
+        skipped = f"\n\n🚫 Пропущено (не ID): {len(rejected)} - {shown}{more}"
+    if not user_ids:
+        await message.answer("⚠️ В сообщении не найдено ни одного ID." + skipped)
+        return
+    
+    admin_id = message.from_user.id
+    admin_ids = [uid for uid in user_ids if uid in tenant.admin_ids]
+    user_ids = [uid for uid in user_ids if uid not in tenant.admin_ids]
+    
+    if state_data.get("bulk_action") == "block":
+        reason = state_data.get("bulk_reason", "")
+        # Данные пользователей берем из базы за один проход (у воркеров-владельцев)
+        found = await find_users(tenant, user_ids)
+        users = {uid: found.get(uid) for uid in user_ids}
+        changed = tenant.block_manager.block_many(
+            users, admin_id=admin_id, reason=reason, duration=state_data.get("bulk_duration")
+        )
+        expiry = format_expiry(tenant.block_manager.blocked_users[str(changed[0])]) if changed else ""
+        for uid in changed:
+            tenant.notifier.notify(
+                uid, f"🚫 Вы были заблокированы администратором.\n📝 Причина: {reason}\n⏳ Срок: {expiry}"
+            )
+        report = (
+            "✅ Массовая блокировка завершена:\n\n"
+            f"┣ 🚫 Заблокировано: {len(changed)}\n"
+            f"┣ ⚠️ Уже были заблокированы: {len(user_ids) - len(changed)}\n"
+            f"┣ 👤 Найдено в базе: {sum(1 for info in users.values() if info)}\n"
+            f"┗ 👑 Пропущено администраторов: {len(admin_ids)}\n\n"
+            f"📝 Причина: {reason}" + (f"\n⏳ Срок: {expiry}" if expiry else "")
+        )
+    else:
+        changed = tenant.block_manager.unblock_many(user_ids, admin_id=admin_id)
+        for uid in changed:
+            tenant.notifier.notify(uid, "✅ Вы были разблокированы администратором.")
+        report = (
+            "✅ Массовая разблокировка завершена:\n\n"
+            f"┣ ✅ Разблокировано: {len(changed)}\n"
+            f"┗ ⚠️ Не были заблокированы: {len(user_ids) - len(changed)}"
+        )
+    
+    await message.answer(report + skipped)
 
 # Кнопка "Статистика"
 @dp.message(F.text == "📊 Статистика")
-async def show_stats_button(message: Message, state: FSMContext):
+async def show_stats_button(message: Message, state: FSMContext, tenant: Tenant):
     user_id = message.from_user.id
     
-    if user_id not in ADMIN_IDS:
+    if user_id not in tenant.admin_ids:
         return
     
     # Очищаем состояние ответа, если оно есть
@@ -857,43 +2883,115 @@ async def show_stats_button(message: Message, state: FSMContext):
     if current_state == AdminStates.waiting_for_reply:
         await state.clear()
     
-    # Получаем статистику за сегодня
-    user_stats = user_manager.get_today_stats()
-    block_stats = block_manager.get_today_stats()
-    post_stats = post_logger.get_today_stats()
-    
-    # Получаем общую статистику
-    total_users = len(user_manager.users)
-    total_blocked = len(block_manager.blocked_users)
-    total_posts = len(post_logger.logs)
+    # Счетчики за сегодня и общие (в шардированном режиме - сумма по воркерам)
+    stats = Counter()
+    for part in await collect_from_shards(tenant, "stats"):
+        stats.update(part)
+    total_blocked = len(tenant.block_manager.blocked_users)
+    executor_stats = update_executor.get_stats()
+    guard = tenant.delivery_guard
     
     # Формируем сообщение со статистикой
     stats_text = (
         "📊 Статистика за сегодня:\n"
-        f"┣ 👤 Новые пользователи: {user_stats.get('new_users_today', 0)}\n"
-        f"┣ 🚫 Заблокированные: {block_stats.get('blocked_today', 0)}\n"
-        f"┣ ✅ Разблокированные: {block_stats.get('unblocked_today', 0)}\n"
-        f"┗ 📨 Постов отправлено: {post_stats.get('posts_today', 0)}\n\n"
+        f"┣ 👤 Новые пользователи: {stats['new_users_today']}\n"
+        f"┣ 🚫 Заблокированные: {stats['blocked_today']}\n"
+        f"┣ ✅ Разблокированные: {stats['unblocked_today']}\n"
+        f"┗ 📨 Постов отправлено: {stats['posts_today']}\n\n"
         
         "📈 Общая статистика:\n"
-        f"┣ 👥 Всего пользователей: {total_users}\n"
+        f"┣ 👥 Всего пользователей: {stats['total_users']}\n"
         f"┣ 🚫 Всего заблокировано: {total_blocked}\n"
-        f"┗ 📨 Всего постов: {total_posts}\n\n"
+        f"┗ 📨 Всего постов: {stats['total_posts']}\n\n"
+        
+        "⚙️ Очередь обработки:\n"
+        f"┣ 👥 Активных пользователей: {executor_stats['active_keys']}\n"
+        f"┣ ⏱ Средняя задержка: {executor_stats['avg_delay'] * 1000:.1f} мс\n"
+        f"┗ ⏱ Максимальная задержка: {executor_stats['max_delay'] * 1000:.1f} мс\n\n"
+        
+        "📭 Доставка:\n"
+        f"┣ 🚷 Недоступных чатов: {len(guard.dead_chats)}\n"
+        f"┣ 🔌 Разомкнутых цепей: {guard.open_circuits()}\n"
+        f"┣ 🛑 Запросов не отправлено: {guard.stats['avoided_dead'] + guard.stats['avoided_circuit']}\n"
+        f"┗ 🔁 Повторов при сбоях: {guard.stats['retries']}\n\n"
         
         f"📅 Дата: {datetime.now().strftime('%d.%m.%Y %H:%M')}"
     )
     
     await message.answer(stats_text)
 
+def sparkline(values: list) -> str:
+    """Мини-график из символов ▁▂▃▄▅▆▇█"""
+    bars = "▁▂▃▄▅▆▇█"
+    peak = max(values, default=0)
+    return "".join(bars[value * (len(bars) - 1) // peak] if peak else bars[0] for value in values)
+
+# Кнопка "Аналитика" - расширенная статистика по колоночному хранилищу
+@dp.message(F.text == "📈 Аналитика")
+async def show_analytics_button(message: Message, state: FSMContext, tenant: Tenant):
+    user_id = message.from_user.id
+    
+    if user_id not in tenant.admin_ids:
+        return
+    
+    # Очищаем состояние ответа, если оно есть
+    current_state = await state.get_state()
+    if current_state == AdminStates.waiting_for_reply:
+        await state.clear()
+    
+    started = time.perf_counter()
+    # Дни считаем от локальной полуночи, чтобы столбцы совпадали с календарными днями
+    today = datetime.combine(date.today(), datetime.min.time())
+    since = (today - timedelta(days=ANALYTICS_DAYS - 1)).timestamp()
+    # В шардированном режиме каждый воркер присылает агрегаты своих пользователей
+    parts = await collect_from_shards(tenant, "analytics", since)
+    posts = sum(part["posts"] for part in parts)
+    avg_length = sum(part["length_sum"] for part in parts) / posts if posts else 0
+    max_length = max((part["max_length"] for part in parts), default=0)
+    per_day = [sum(column) for column in zip(*(part["per_day"] for part in parts))] or [0] * ANALYTICS_DAYS
+    per_hour = [sum(column) for column in zip(*(part["per_hour"] for part in parts))] or [0] * ANALYTICS_DAYS * 24
+    by_hour_of_day = [sum(per_hour[hour::24]) for hour in range(24)]
+    top = sorted((sender for part in parts for sender in part["top"]), key=lambda sender: -sender[1])[:5]
+    mix = Counter()
+    for part in parts:
+        mix.update(part["media"])
+    elapsed = (time.perf_counter() - started) * 1000
+    
+    text = (
+        f"📈 Аналитика за {ANALYTICS_DAYS} дней:\n"
+        f"┣ 📨 Постов: {posts}\n"
+        f"┣ 👥 Авторов: {sum(part['senders'] for part in parts)}\n"
+        f"┣ 📏 Средняя длина: {avg_length:.0f} симв.\n"
+        f"┗ 📏 Максимальная длина: {max_length} симв.\n\n"
+        f"📅 По дням (макс. {max(per_day)}):\n{sparkline(per_day)}\n\n"
+        f"🕒 По часам суток 00-23 (макс. {max(by_hour_of_day)}):\n{sparkline(by_hour_of_day)}\n\n"
+    )
+    
+    if top:
+        text += "🏆 Самые активные авторы:\n"
+        for place, (sender_id, count, info) in enumerate(top, 1):
+            name = f"{info.get('first_name') or ''} {info.get('last_name') or ''}".strip()
+            text += f"{place}. {name or 'Без имени'} ({sender_id}) - {count}\n"
+        text += "\n"
+    
+    if mix:
+        text += "🗂 Типы контента:\n"
+        for media_type, count in sorted(mix.items(), key=lambda item: -item[1]):
+            text += f"┣ {media_type}: {count} ({count * 100 / posts:.0f}%)\n"
+        text += "\n"
+    
+    text += f"⏱ Расчет: {elapsed:.1f} мс"
+    await message.answer(text)
+
 # Обработка сообщений от пользователей (не админов)
-@dp.message(F.from_user.id.not_in(ADMIN_IDS))
-async def handle_user_message(message: Message, state: FSMContext):
+@dp.message(~IsAdmin())
+async def handle_user_message(message: Message, state: FSMContext, tenant: Tenant):
     """Обработка всех сообщений от пользователей (не админов)"""
     user_id = message.from_user.id
     user = message.from_user
     
     # Обновляем информацию о пользователе
-    user_manager.add_user(
+    tenant.user_manager.add_user(
         user_id=user_id,
         username=user.username,
         first_name=user.first_name,
@@ -901,7 +2999,7 @@ async def handle_user_message(message: Message, state: FSMContext):
     )
     
     # Проверка на блокировку
-    if block_manager.is_blocked(user_id):
+    if tenant.block_manager.is_blocked(user_id):
         await message.answer("❌ Вы заблокированы и не можете отправлять сообщения.")
         return
     
@@ -915,7 +3013,7 @@ async def handle_user_message(message: Message, state: FSMContext):
         if admin_id:
             try:
                 # Отправляем ответ администратору
-                success = await send_reply_to_admin(admin_id, message, user)
+                success = await send_reply_to_admin(tenant, admin_id, message, user)
                 
                 if success:
                     await message.answer("✅ Ваш ответ отправлен администратору.")
@@ -924,20 +3022,18 @@ async def handle_user_message(message: Message, state: FSMContext):
                     await message.answer("❌ Не удалось отправить ответ администратору.")
                 
             except Exception as e:
-                logger.error(f"Ошибка отправки ответа администратору {admin_id}: {e}")
+                logger.error("Ошибка отправки ответа администратору %s: %s", admin_id, e)
                 await message.answer("❌ Не удалось отправить ответ администратору.")
         else:
             await state.clear()
-            await send_post_to_admins(message, user)
-            await message.answer("✅ Ваш пост отправлен администраторам анонимно!")
+            await accept_post(tenant, message, user)
     else:
         # Если пользователь не отвечает, отправляем как обычную предложку
-        await send_post_to_admins(message, user)
-        await message.answer("✅ Ваш пост отправлен администраторам анонимно!")
+        await accept_post(tenant, message, user)
 
 # Обработка сообщений от администраторов
-@dp.message(F.from_user.id.in_(ADMIN_IDS))
-async def handle_admin_message(message: Message, state: FSMContext):
+@dp.message(IsAdmin())
+async def handle_admin_message(message: Message, state: FSMContext, tenant: Tenant):
     """Обработка всех сообщений от администраторов"""
     admin_id = message.from_user.id
     
@@ -950,13 +3046,13 @@ async def handle_admin_message(message: Message, state: FSMContext):
         
         if reply_to_user_id:
             # Проверяем, не заблокирован ли пользователь
-            if block_manager.is_blocked(reply_to_user_id):
+            if tenant.block_manager.is_blocked(reply_to_user_id):
                 await message.answer("❌ Этот пользователь заблокирован.")
                 await state.clear()
                 return
             
             # Отправляем ответ пользователю
-            success = await send_reply_to_user(reply_to_user_id, message, message.from_user)
+            success = await send_reply_to_user(tenant, reply_to_user_id, message, message.from_user)
             
             if success:
                 await message.answer(f"✅ Ответ отправлен пользователю {reply_to_user_id}")
@@ -966,31 +3062,125 @@ async def handle_admin_message(message: Message, state: FSMContext):
         else:
             await state.clear()
             await message.answer("❌ Ошибка: не найден пользователь для ответа.")
+    elif message.reply_to_message:
+        # Ответ обычным reply на пересланный пост или ответ пользователя
+        reply_to_user_id = tenant.reply_index.get(message.chat.id, message.reply_to_message.message_id)
+        
+        if reply_to_user_id is None:
+            await message.answer("❌ Не удалось определить пользователя для ответа на это сообщение.")
+            return
+        
+        if tenant.block_manager.is_blocked(reply_to_user_id):
+            await message.answer("❌ Этот пользователь заблокирован.")
+            return
+        
+        success = await send_reply_to_user(tenant, reply_to_user_id, message, message.from_user)
+        
+        if success:
+            await message.answer(f"✅ Ответ отправлен пользователю {reply_to_user_id}")
+        else:
+            await message.answer("❌ Не удалось отправить ответ пользователю.")
+
+# Обработка решения по задержанному посту
+@dp.callback_query(F.data.startswith("held_"))
+async def held_post_callback(callback: CallbackQuery, tenant: Tenant):
+    if callback.from_user.id not in tenant.admin_ids:
+        await callback.answer("⛔ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    _, decision, held_id = callback.data.split("_", 2)
+    item = tenant.content_filter.pop_held(held_id)
+    if item is None:
+        await callback.answer("ℹ️ Решение по этому посту уже принято.", show_alert=True)
+        return
+    
+    if decision == "release":
+        message = Message.model_validate(item["message"])
+        user = types.User.model_validate(item["user"])
+        tenant.post_queue.put(message, user, tags=item["words"])
+        result = "✅ Пропущен"
+    else:
+        result = "❌ Отклонен"
+    
+    await callback.message.edit_text(f"{callback.message.text}\n\n{result}")
+    await callback.answer(result)
+
+# Обработка кнопок модерации: одобрить / в расписание / отклонить
+@dp.callback_query(F.data.startswith("pub_"))
+async def publication_callback(callback: CallbackQuery, tenant: Tenant):
+    if callback.from_user.id not in tenant.admin_ids:
+        await callback.answer("⛔ У вас нет прав администратора.", show_alert=True)
+        return
+    
+    if not tenant.channel_id:
+        await callback.answer("❌ Канал для публикации не настроен.", show_alert=True)
+        return
+    
+    # pub_<решение>_<чат>_<сообщение>[_<время>]
+    _, decision, chat_id, message_id, *publish_at = callback.data.split("_")
+    chat_id, message_id = int(chat_id), int(message_id)
+    post_key = f"{chat_id}_{message_id}"
+    
+    if decision == "schedule":
+        # Выбор одного из ближайших свободных слотов
+        if post_key in tenant.scheduler.entries or post_key in tenant.scheduler.published:
+            await callback.answer("ℹ️ Пост уже в расписании или опубликован.", show_alert=True)
+            return
+        slot_buttons = [
+            InlineKeyboardButton(
+                text=datetime.fromtimestamp(slot).strftime('%d.%m %H:%M'),
+                callback_data=f"pub_at_{post_key}_{int(slot)}"
+            ) for slot in tenant.scheduler.upcoming_slots(3)
+        ]
+        keyboard = callback.message.reply_markup.inline_keyboard[:1] + [
+            slot_buttons, [InlineKeyboardButton(text="❌ Отклонить", callback_data=f"pub_reject_{post_key}")]
+        ]
+        await callback.message.edit_reply_markup(reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard))
+        await callback.answer("🕒 Выберите время публикации")
+        return
+    
+    if decision == "reject":
+        tenant.scheduler.cancel(chat_id, message_id)
+        result = "❌ Пост отклонен"
+    else:
+        # Одобрение - ближайший свободный слот; выбранное время сдвигается, если слот уже занят
+        publish_at = tenant.scheduler.schedule(
+            chat_id, message_id, int(publish_at[0]) if publish_at else None
+        )
+        if publish_at is None:
+            await callback.answer("ℹ️ Пост уже в расписании или опубликован.", show_alert=True)
+            return
+        result = f"✅ Пост одобрен, публикация: {datetime.fromtimestamp(publish_at).strftime('%d.%m.%Y %H:%M')}"
+    
+    # Оставляем только кнопку "Ответить"
+    reply_kb = InlineKeyboardMarkup(inline_keyboard=callback.message.reply_markup.inline_keyboard[:1])
+    await callback.message.edit_reply_markup(reply_markup=reply_kb)
+    await callback.answer(result, show_alert=True)
 
 # Обработка callback кнопки "Ответить"
 @dp.callback_query(F.data.startswith("reply_"))
-async def reply_to_user_callback(callback: CallbackQuery, state: FSMContext):
+async def reply_to_user_callback(callback: CallbackQuery, state: FSMContext, tenant: Tenant):
     user_id = callback.from_user.id
     target_user_id = int(callback.data.split("_")[1])
     
     # Проверяем, не заблокирован ли текущий пользователь
-    if block_manager.is_blocked(user_id):
+    if tenant.block_manager.is_blocked(user_id):
         await callback.answer("❌ Вы заблокированы и не можете отвечать на сообщения.", show_alert=True)
         return
     
     # Проверяем, не заблокирован ли целевой пользователь
-    if block_manager.is_blocked(target_user_id):
+    if tenant.block_manager.is_blocked(target_user_id):
         await callback.answer("❌ Этот пользователь заблокирован.", show_alert=True)
         return
     
-    if user_id in ADMIN_IDS:
+    if user_id in tenant.admin_ids:
         # Админ отвечает пользователю
         # Сохраняем ID пользователя, которому отвечаем
         await state.set_state(AdminStates.waiting_for_reply)
         await state.update_data(reply_to_user=target_user_id)
         
         # Получаем информацию о пользователе
-        user_info = user_manager.get_user_info(target_user_id)
+        user_info = tenant.user_manager.get_user_info(target_user_id)
         name = f"{user_info.get('first_name', '')} {user_info.get('last_name', '')}".strip() if user_info else "Без имени"
         
         await callback.message.answer(
@@ -1005,7 +3195,7 @@ async def reply_to_user_callback(callback: CallbackQuery, state: FSMContext):
     else:
         # Пользователь отвечает администратору
         # Проверяем, что целевой пользователь - администратор
-        if target_user_id not in ADMIN_IDS:
+        if target_user_id not in tenant.admin_ids:
             await callback.answer("❌ Вы можете отвечать только администраторам.", show_alert=True)
             return
         
@@ -1021,20 +3211,746 @@ async def reply_to_user_callback(callback: CallbackQuery, state: FSMContext):
         
         await callback.answer("Отвечаете администратору")
 
-# Запуск бота
-async def main():
-    # Создаем файлы если их нет
-    for filename in [BLOCKED_FILE, POSTS_LOG, USERS_LOG]:
-        if not os.path.exists(filename):
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump({} if filename != POSTS_LOG else [], f)
+# Шардированный режим: фронт-процесс раздает апдейты воркерам по user_id
+def get_shard(bot_id: int, user_id: int, shards: int) -> int:
+    """Номер воркера, владеющего данными пользователя"""
+    return zlib.crc32(f"{bot_id}:{user_id}".encode()) % shards
+
+class ReplicatedContentFilter(ContentFilter):
+    """Фильтр воркера: после изменения списка остальные воркеры перечитывают файл"""
+    
+    def __init__(self, filename: str, held_filename: str, bot_id: int, outbox: multiprocessing.Queue):
+        super().__init__(filename, held_filename)
+        self.bot_id = bot_id
+        self.outbox = outbox
+    
+    async def add_word(self, word: str, action: str):
+        await super().add_word(word, action)
+        self.outbox.put(("filter", self.bot_id, None, None))
+    
+    async def remove_word(self, word: str) -> bool:
+        success = await super().remove_word(word)
+        if success:
+            self.outbox.put(("filter", self.bot_id, None, None))
+        return success
+
+class ReplicatedBlockManager(BlockManager):
+    """Список блокировок воркера: изменения рассылаются остальным воркерам через фронт.
+
+    Каждый воркер держит список в памяти, а общий файл пишет только основной
+    воркер (writer), получая изменения остальных через ту же рассылку.
+    """
+    
+    def __init__(self, filename: str, bot_id: int, outbox: multiprocessing.Queue, writer: bool):
+        super().__init__(filename)
+        self.bot_id = bot_id
+        self.outbox = outbox
+        self.writer = writer
     
-    logger.info("Бот запущен...")
+    def save_blocked(self):
+        if self.writer:
+            super().save_blocked()
     
-    # Убедимся, что ADMIN_IDS содержит реальные ID
-    logger.info(f"Администраторы: {ADMIN_IDS}")
+    def block_user(self, user_id: int, *args, **kwargs):
+        super().block_user(user_id, *args, **kwargs)
+        self.outbox.put(("block", self.bot_id, str(user_id), self.blocked_users[str(user_id)]))
     
-    await dp.start_polling(bot)
+    def unblock_user(self, user_id: int, admin_id: int = None):
+        success = super().unblock_user(user_id, admin_id)
+        if success:
+            self.outbox.put(("unblock", self.bot_id, str(user_id), None))
+        return success
+    
+    def block_many(self, users: dict, admin_id: int = None, reason: str = "", duration: int = None) -> list:
+        blocked = super().block_many(users, admin_id, reason, duration)
+        if blocked:
+            self.outbox.put(("bulk", self.bot_id, None, {
+                "block": {str(uid): self.blocked_users[str(uid)] for uid in blocked}, "unblock": []
+            }))
+        return blocked
+    
+    def unblock_many(self, user_ids: list, admin_id: int = None) -> list:
+        unblocked = super().unblock_many(user_ids, admin_id)
+        if unblocked:
+            self.outbox.put(("bulk", self.bot_id, None, {
+                "block": {}, "unblock": [str(uid) for uid in unblocked]
+            }))
+        return unblocked
+    
+    def apply_replica(self, action: str, user_id_str: str, data: dict):
+        """Применение изменения другого воркера (свое изменение возвращается от фронта и пропускается)"""
+        if action == "block":
+            blocked, unblocked = {user_id_str: data}, []
+        elif action == "unblock":
+            blocked, unblocked = {}, [user_id_str]
+        else:
+            blocked, unblocked = data["block"], data["unblock"]
+        blocked = {uid: block_data for uid, block_data in blocked.items() if self.blocked_users.get(uid) != block_data}
+        unblocked = [uid for uid in unblocked if uid in self.blocked_users and uid not in blocked]
+        if not blocked and not unblocked:
+            return
+        for uid in unblocked:
+            del self.blocked_users[uid]
+        self.blocked_users.update(blocked)
+        self.save_blocked()
+        if self.on_block is not None:
+            for uid, block_data in blocked.items():
+                self.on_block(uid, block_data)
+
+class ShardPeers:
+    """Запросы воркера к другим воркерам через фронт.
+
+    Пользователи и посты хранятся только у воркера-владельца. Админские сценарии,
+    которым нужны чужие данные, спрашивают владельца (данные пользователей по ID)
+    или собирают с каждого воркера небольшие агрегаты (статистика, аналитика).
+    """
+    
+    def __init__(self, tenant: "Tenant", index: int, shards: int, outbox: multiprocessing.Queue):
+        self.tenant = tenant
+        self.index = index
+        self.shards = shards
+        self.outbox = outbox
+        self._requests = {}  # request_id -> Future
+        self._ids = itertools.count(1)
+    
+    def shard_of(self, user_id: int) -> int:
+        return get_shard(self.tenant.bot.id, user_id, self.shards)
+    
+    async def query(self, shard: int, name: str, *args):
+        """Результат запроса name у воркера shard (свой воркер отвечает без обращения к фронту)"""
+        if shard == self.index:
+            return SHARD_QUERIES[name](self.tenant, *args)
+        request_id = next(self._ids)
+        future = self._requests[request_id] = asyncio.get_running_loop().create_future()
+        self.outbox.put(("query", self.tenant.bot.id, shard, self.index, request_id, name, args))
+        try:
+            return await asyncio.wait_for(future, SHARD_QUERY_TIMEOUT)
+        finally:
+            self._requests.pop(request_id, None)
+    
+    async def query_all(self, name: str, *args) -> list:
+        """Результаты запроса со всех воркеров; не ответившие пропускаются"""
+        results = await asyncio.gather(
+            *(self.query(shard, name, *args) for shard in range(self.shards)), return_exceptions=True
+        )
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if failed:
+            logger.warning("[%s] Не ответили воркеры на запрос %s: %s", self.tenant.name, name, failed)
+        return [result for result in results if not isinstance(result, Exception)]
+    
+    def resolve(self, request_id: int, result):
+        """Ответ другого воркера на запрос"""
+        future = self._requests.get(request_id)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+def local_users(tenant: "Tenant", user_ids: list) -> dict:
+    """Записи известных этому процессу пользователей: user_id -> данные"""
+    users = {}
+    for user_id in user_ids:
+        info = tenant.user_manager.users.get(str(user_id))
+        if info is not None:
+            users[user_id] = info
+    return users
+
+def local_stats(tenant: "Tenant") -> dict:
+    """Счетчики панели статистики по данным этого процесса (суммируются по воркерам)"""
+    return {
+        **tenant.user_manager.get_today_stats(),
+        **tenant.block_manager.get_today_stats(),
+        **tenant.post_logger.get_today_stats(),
+        "total_users": len(tenant.user_manager.users),
+        "total_posts": len(tenant.post_logger.logs)
+    }
+
+def local_analytics(tenant: "Tenant", since: float) -> dict:
+    """Агрегаты аналитики по данным этого процесса.
+
+    Пользователь принадлежит одному воркеру, поэтому число авторов и топ авторов
+    складываются из ответов воркеров без потерь.
+    """
+    stats = tenant.post_stats
+    agg = stats.aggregate(since)
+    return {
+        "posts": agg["hi"] - agg["lo"],
+        "senders": len(agg["senders"]),
+        "length_sum": agg["length_sum"],
+        "max_length": agg["max_length"],
+        "per_day": stats.histogram(since, 86400, ANALYTICS_DAYS),
+        "per_hour": stats.histogram(since, 3600, ANALYTICS_DAYS * 24),
+        "top": [
+            (sender_id, count, tenant.user_manager.users.get(str(sender_id)) or {})
+            for sender_id, count in stats.top_senders(since)
+        ],
+        "media": stats.media_mix(since)
+    }
+
+SHARD_QUERIES = {"users": local_users, "stats": local_stats, "analytics": local_analytics}
+
+async def find_users(tenant: "Tenant", user_ids: list) -> dict:
+    """Данные пользователей (в шардированном режиме - у воркеров-владельцев): user_id -> данные"""
+    if tenant.peers is None:
+        return local_users(tenant, user_ids)
+    by_shard = {}
+    for user_id in user_ids:
+        by_shard.setdefault(tenant.peers.shard_of(user_id), []).append(user_id)
+    results = await asyncio.gather(
+        *(tenant.peers.query(shard, "users", ids) for shard, ids in by_shard.items()), return_exceptions=True
+    )
+    users = {}
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("[%s] Данные пользователей не получены: %s", tenant.name, result)
+        else:
+            users.update(result)
+    return users
+
+async def collect_from_shards(tenant: "Tenant", name: str, *args) -> list:
+    """Результаты запроса name со всех воркеров (без шардирования - один локальный)"""
+    if tenant.peers is None:
+        return [SHARD_QUERIES[name](tenant, *args)]
+    return await tenant.peers.query_all(name, *args)
+
+async def run_shard(index: int, shards: int, inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    """Воркер: обрабатывает апдейты своей части пользователей"""
+    configs = load_tenant_configs()
+    for config in configs:
+        base_dir = config.get("data_dir") or config.get("name") or "."
+        config["data_dir"] = os.path.join(base_dir, f"shard{index}")
+        config["base_dir"] = base_dir
+    tenants.update(create_tenants(configs, http_session))
+    
+    for config, tenant in zip(configs, tenants.values()):
+        # Список блокировок общий и реплицируется между воркерами
+        tenant.block_manager = ReplicatedBlockManager(
+            os.path.join(config["base_dir"], BLOCKED_FILE), tenant.bot.id, outbox, writer=index == PRIMARY_SHARD
+        )
+        tenant.content_filter = ReplicatedContentFilter(
+            os.path.join(config["base_dir"], BANNED_WORDS_FILE), tenant.path(HELD_POSTS_FILE),
+            tenant.bot.id, outbox
+        )
+        # Пользователи и посты остаются у воркера-владельца, чужие данные запрашиваются
+        tenant.peers = ShardPeers(tenant, index, shards, outbox)
+        # Расписание одно на бота: модерация ("pub_*") идет только основному воркеру
+        tenant.scheduler = (
+            PublicationScheduler(os.path.join(config["base_dir"], SCHEDULE_FILE), tenant)
+            if index == PRIMARY_SHARD else None
+        )
+        # Временные блокировки снимает воркер, владеющий пользователем
+        tenant.ban_expiry.owns = lambda uid, bot_id=tenant.bot.id: get_shard(bot_id, uid, shards) == index
+        # Фронт тоже ведет индекс, чтобы направить ответ админа воркеру пользователя
+        tenant.reply_index.on_put = lambda chat_id, message_id, user_id, bot_id=tenant.bot.id: outbox.put(
+            ("reply_index", bot_id, chat_id, message_id, user_id)
+        )
+        await tenant.post_queue.start()
+        if tenant.scheduler is not None:
+            await tenant.scheduler.start()
+        await tenant.notifier.start()
+        await tenant.ban_expiry.start()
+    
+    logger.info("Воркер %s/%s запущен", index, shards)
+    config_watcher = ConfigWatcher(TENANTS_FILE, apply_tenant_configs)
+    await config_watcher.start()
+    loop = asyncio.get_running_loop()
+    tasks = set()
+    try:
+        while True:
+            kind, bot_id, *payload = await loop.run_in_executor(None, inbox.get)
+            if kind == "stop":
+                break
+            tenant = tenants.get(bot_id)
+            if tenant is None:
+                continue
+            if kind == "update":
+                task = asyncio.create_task(dp.feed_raw_update(tenant.bot, payload[0]))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            elif kind == "filter":
+                await tenant.content_filter.reload()
+            elif kind == "query":
+                _, origin, request_id, name, args = payload
+                try:
+                    result = SHARD_QUERIES[name](tenant, *args)
+                except Exception as e:
+                    logger.error("[%s] Ошибка запроса %s: %s", tenant.name, name, e)
+                    continue
+                outbox.put(("answer", bot_id, origin, request_id, result))
+            elif kind == "answer":
+                tenant.peers.resolve(*payload[1:])
+            else:
+                tenant.block_manager.apply_replica(kind, *payload)
+        await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await config_watcher.stop()
+        for tenant in tenants.values():
+            await tenant.post_queue.stop()
+            if tenant.scheduler is not None:
+                await tenant.scheduler.stop()
+            await tenant.notifier.stop()
+            await tenant.ban_expiry.stop()
+            tenant.reply_index.save_index()
+            tenant.processed_updates.save_state()
+        await http_session.close()
+
+def run_shard_process(index: int, shards: int, inbox: multiprocessing.Queue, outbox: multiprocessing.Queue):
+    asyncio.run(run_shard(index, shards, inbox, outbox))
+
+class ShardRouter:
+    """Выбор воркера для апдейта.
+
+    Апдейты пользователя идут воркеру-владельцу. Ответ админа ("reply_<id>")
+    идет воркеру целевого пользователя, и следующие сообщения админа этого
+    бота направляются туда же, пока он не начнет ответ другому пользователю.
+    Решения по задержанным постам ("held_*_<id>_...") идут воркеру автора поста,
+    как и ответ админа обычным reply на сообщение, известное индексу ответов.
+    Модерация ("pub_*") идет основному воркеру, который ведет расписание публикаций.
+    """
+    
+    TARGET_CALLBACK = re.compile(r"^held_[a-z]+_(\d+)_")
+    
+    def __init__(self, shards: int, admin_ids: dict, reply_indexes: dict):
+        self.shards = shards
+        self.admin_ids = admin_ids  # bot_id -> frozenset(admin_id)
+        self.reply_indexes = reply_indexes  # bot_id -> ReplyIndex
+        self.admin_routes = {}  # (bot_id, admin_id) -> shard
+    
+    def route(self, bot_id: int, update: Update) -> int:
+        try:
+            event = update.event
+        except Exception:
+            return 0
+        user = getattr(event, "from_user", None)
+        if user is None:
+            return 0
+        if user.id not in self.admin_ids.get(bot_id, ()):
+            return get_shard(bot_id, user.id, self.shards)
+        
+        key = (bot_id, user.id)
+        if isinstance(event, CallbackQuery) and (event.data or "").startswith("pub_"):
+            return PRIMARY_SHARD
+        target = self.TARGET_CALLBACK.match(event.data or "") if isinstance(event, CallbackQuery) else None
+        if target:
+            return get_shard(bot_id, int(target.group(1)), self.shards)
+        reply_to = getattr(event, "reply_to_message", None)
+        if reply_to is not None:
+            target_user_id = self.reply_indexes[bot_id].get(event.chat.id, reply_to.message_id)
+            if target_user_id is not None:
+                return get_shard(bot_id, target_user_id, self.shards)
+        if isinstance(event, CallbackQuery) and (event.data or "").startswith("reply_"):
+            target_user_id = int(event.data.split("_")[1])
+            self.admin_routes[key] = get_shard(bot_id, target_user_id, self.shards)
+        return self.admin_routes.get(key, get_shard(bot_id, user.id, self.shards))
+
+async def run_front(shards: int):
+    """Фронт-процесс: long polling всех ботов и раздача апдейтов воркерам"""
+    configs = load_tenant_configs()
+    context = multiprocessing.get_context("spawn")
+    inboxes = [context.Queue() for _ in range(shards)]
+    outbox = context.Queue()
+    processes = [
+        context.Process(target=run_shard_process, args=(index, shards, inboxes[index], outbox), daemon=True)
+        for index in range(shards)
+    ]
+    for process in processes:
+        process.start()
+    
+    bots = [Bot(token=config["token"], session=http_session) for config in configs]
+    reply_indexes = {
+        bot.id: ReplyIndex(os.path.join(config.get("data_dir") or config.get("name") or ".", REPLY_INDEX_FILE))
+        for bot, config in zip(bots, configs)
+    }
+    router = ShardRouter(shards, {
+        bot.id: frozenset(config.get("admin_ids", [])) for bot, config in zip(bots, configs)
+    }, reply_indexes)
+    
+    def apply_router_configs(configs: list):
+        # Словарь заменяется целиком, чтобы маршрутизация не видела частично обновленный состав
+        router.admin_ids = {
+            bot_id: frozenset(config.get("admin_ids", []))
+            for bot_id, config in validate_tenant_configs(configs).items()
+        }
+    
+    config_watcher = ConfigWatcher(TENANTS_FILE, apply_router_configs)
+    allowed_updates = dp.resolve_used_update_types()
+    loop = asyncio.get_running_loop()
+    
+    async def replicate():
+        # Изменения блокировок и фильтра от одного воркера рассылаются всем,
+        # запросы данных - воркеру-адресату, ответы - спросившему
+        while True:
+            message = await loop.run_in_executor(None, outbox.get)
+            if message is None:
+                break
+            if message[0] == "reply_index":
+                reply_indexes[message[1]].put(*message[2:])
+            elif message[0] in ("query", "answer"):
+                inboxes[message[2]].put(message)
+            else:
+                for inbox in inboxes:
+                    inbox.put(message)
+    
+    async def poll(bot: Bot):
+        offset = None
+        while True:
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, timeout=POLLING_TIMEOUT, allowed_updates=allowed_updates
+                )
+            except Exception as e:
+                logger.error("Ошибка получения апдейтов бота %s: %s", bot.id, e)
+                await asyncio.sleep(1)
+                continue
+            for update in updates:
+                shard = router.route(bot.id, update)
+                inboxes[shard].put((
+                    "update", bot.id, update.model_dump(mode="json", exclude_none=True, by_alias=True)
+                ))
+                offset = update.update_id + 1
+    
+    logger.info("Фронт запущен: ботов %s, воркеров %s", len(bots), shards)
+    await config_watcher.start()
+    try:
+        await asyncio.gather(replicate(), *(poll(bot) for bot in bots))
+    finally:
+        await config_watcher.stop()
+        outbox.put(None)
+        for reply_index in reply_indexes.values():
+            reply_index.save_index()
+        for inbox in inboxes:
+            inbox.put(("stop", None))
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 10)
+        await http_session.close()
+
+# Запись реального трафика для последующего воспроизведения
+class TraceAnonymizer:
+    """Обезличивание апдейтов по белому списку: в трассу попадает только то, что нужно для воспроизведения.
+
+    ID пользователей и файлов хешируются, тексты пользователей маскируются,
+    обязательные для разбора имена и телефоны заменяются на "x", координаты
+    обнуляются; все поля, которых нет в списках ниже (пересылки, подписи,
+    адреса, ссылки и т.д.), отбрасываются. ID и тексты администраторов
+    сохраняются, чтобы при воспроизведении работали админские сценарии; числовые
+    ID в их сообщениях и в callback "reply_<id>" заменяются теми же псевдонимами.
+    """
+    
+    # Вложенные объекты, которые обходятся рекурсивно
+    CONTAINERS = (
+        "message", "edited_message", "callback_query", "from", "chat", "reply_to_message",
+        "photo", "video", "document", "voice", "audio", "sticker", "animation", "video_note",
+        "location", "contact", "entities", "caption_entities", "thumbnail"
+    )
+    # Служебные поля, которые сохраняются как есть
+    STRUCTURAL_FIELDS = (
+        "update_id", "message_id", "date", "edit_date", "type", "is_bot", "chat_instance",
+        "media_group_id", "offset", "length", "width", "height", "duration", "file_size",
+        "mime_type", "is_animated", "is_video"
+    )
+    # Обязательные для разбора поля с личными данными: остается только длина
+    MASKED_FIELDS = ("first_name", "phone_number")
+    
+    def __init__(self, salt: bytes = None):
+        self.salt = salt or os.urandom(16)
+    
+    def pseudonym(self, value) -> str:
+        return hashlib.blake2b(str(value).encode(), key=self.salt, digest_size=6).hexdigest()
+    
+    def user_id(self, user_id: int, admin_ids) -> int:
+        if user_id in admin_ids:
+            return user_id
+        return int(self.pseudonym(user_id), 16)
+    
+    def text(self, text: str, is_admin: bool, admin_ids) -> str:
+        if is_admin:
+            if text.strip().isdigit():
+                return str(self.user_id(int(text.strip()), admin_ids))
+            return text
+        # Команды оставляем, остальное маскируем с сохранением длины
+        command, separator, rest = text.partition(" ") if text.startswith("/") else ("", "", text)
+        return command + separator + re.sub(r"\w", "x", rest)
+    
+    def anonymize(self, update: dict, admin_ids) -> dict:
+        sender = next(
+            (event["from"]["id"] for event in update.values() if isinstance(event, dict) and "from" in event),
+            None
+        )
+        return self._walk(update, sender in admin_ids, admin_ids)
+    
+    def _walk(self, value, is_admin: bool, admin_ids):
+        if isinstance(value, list):
+            return [self._walk(item, is_admin, admin_ids) for item in value]
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            if key in self.CONTAINERS:
+                result[key] = self._walk(item, is_admin, admin_ids)
+            elif key in self.STRUCTURAL_FIELDS:
+                result[key] = item
+            elif key in self.MASKED_FIELDS:
+                result[key] = "x" * len(str(item))
+            elif key == "id":
+                # ID пользователя или чата - число, ID callback-запроса - строка
+                result[key] = self.user_id(item, admin_ids) if isinstance(item, int) else self.pseudonym(item)
+            elif key in ("file_id", "file_unique_id"):
+                result[key] = self.pseudonym(item)
+            elif key in ("text", "caption") and isinstance(item, str):
+                result[key] = self.text(item, is_admin, admin_ids)
+            elif key == "data" and isinstance(item, str):
+                prefix, separator, target = item.partition("_")
+                result[key] = f"{prefix}_{self.user_id(int(target), admin_ids)}" if target.isdigit() else item
+            elif key in ("latitude", "longitude"):
+                result[key] = 0.0
+        return result
+
+class TraceRecord:
+    """Запись трассы: сериализуется только при форматировании в фоновом потоке логирования"""
+    
+    def __init__(self, anonymizer: TraceAnonymizer, bot_id: int, update: Update, admin_ids):
+        self.ts = time.time()
+        self.anonymizer = anonymizer
+        self.bot_id = bot_id
+        self.update = update
+        self.admin_ids = set(admin_ids)
+    
+    def __str__(self) -> str:
+        update = self.update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        return json.dumps({
+            "ts": self.ts,
+            "bot_id": self.bot_id,
+            "update": self.anonymizer.anonymize(update, self.admin_ids)
+        }, ensure_ascii=False)
+
+class TraceRecorderMiddleware(BaseMiddleware):
+    """Внешний middleware: запись входящих апдейтов в трассу"""
+    
+    def __init__(self, trace_logger: logging.Logger, anonymizer: TraceAnonymizer):
+        self.trace_logger = trace_logger
+        self.anonymizer = anonymizer
+    
+    async def __call__(self, handler, event, data: dict):
+        tenant = data.get("tenant")
+        self.trace_logger.info("%s", TraceRecord(
+            self.anonymizer, data["bot"].id, event, tenant.admin_ids if tenant else ()
+        ))
+        return await handler(event, data)
+
+def setup_recorder(path: str):
+    """Включение записи апдейтов в ротируемые JSONL-файлы"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    trace_queue = queue.SimpleQueue()
+    file_handler = logging.handlers.RotatingFileHandler(
+        path, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS, encoding="utf-8"
+    )
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    trace_logger = logging.getLogger("trace")
+    trace_logger.propagate = False
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.handlers[:] = [LazyQueueHandler(trace_queue)]
+    
+    listener = logging.handlers.QueueListener(trace_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    dp.update.outer_middleware(TraceRecorderMiddleware(trace_logger, TraceAnonymizer()))
+    logger.info("Запись трассы апдейтов: %s", path)
+
+# Воспроизведение трассы с имитацией Bot API
+class ReplaySession(BaseSession):
+    """Сессия без сети: считает вызовы Bot API и возвращает заглушки"""
+    
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+    
+    async def make_request(self, bot: Bot, method, timeout: int = None):
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        # Заглушка того же типа, что вернул бы Bot API (например, MessageId для copy_message)
+        returning = method.__returning__
+        if returning is Message:
+            chat_id = getattr(method, "chat_id", 0)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private")
+            )
+        if returning is MessageId:
+            return MessageId(message_id=next(self._message_ids))
+        if returning is File:
+            return File(file_id=method.file_id, file_unique_id=method.file_id, file_path=method.file_id)
+        if getattr(returning, "__origin__", None) is list:
+            return []
+        return True
+    
+    async def stream_content(self, url: str, headers: dict = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True):
+        yield b""
+    
+    async def close(self):
+        pass
+
+def percentile(values: list, fraction: float) -> float:
+    """Перцентиль по отсортированному списку"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+async def run_replay(trace_paths: list, speed: float = 0.0, latency_ms: float = 0.0):
+    """Прогон трассы через диспетчер на пустых данных во временном каталоге.
+
+    speed = 0 - максимально быстро, 1 - в исходном темпе, 2 - вдвое быстрее и т.д.
+    """
+    records = []
+    for path in trace_paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    if not records:
+        print("Трасса пуста")
+        return
+    
+    logging.getLogger().setLevel(logging.WARNING)
+    session = ReplaySession(latency_ms / 1000)
+    data_dir = tempfile.mkdtemp(prefix="replay_")
+    # Настоящий токен для воспроизведения не нужен: конфигурация берется только ради списка админов
+    configs = load_tenant_configs() if os.path.exists(TENANTS_FILE) or BOT_TOKEN and ADMIN_IDS else []
+    known_configs = {int(config["token"].split(":")[0]): config for config in configs}
+    tenants.update(create_tenants([
+        {
+            "name": str(bot_id),
+            "token": f"{bot_id}:replay",
+            "admin_ids": known_configs.get(bot_id, {}).get("admin_ids", []),
+            "data_dir": os.path.join(data_dir, str(bot_id))
+        } for bot_id in dict.fromkeys(record["bot_id"] for record in records)
+    ], session))
+    for tenant in tenants.values():
+        await tenant.post_queue.start()
+        await tenant.scheduler.start()
+        await tenant.notifier.start()
+        await tenant.ban_expiry.start()
+    
+    latencies = []
+    
+    async def feed(tenant: Tenant, update: dict):
+        started_at = time.perf_counter()
+        try:
+            await dp.feed_raw_update(tenant.bot, update)
+        finally:
+            latencies.append(time.perf_counter() - started_at)
+    
+    io_before = dict(state_io_stats)
+    first_ts = records[0]["ts"]
+    started_at = time.perf_counter()
+    tasks = []
+    for record in records:
+        if speed > 0:
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - started_at)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed(tenants[record["bot_id"]], record["update"])))
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for tenant in tenants.values():
+        await tenant.post_queue.join()
+    elapsed = time.perf_counter() - started_at
+    
+    for tenant in tenants.values():
+        await tenant.post_queue.stop()
+        await tenant.scheduler.stop()
+        await tenant.notifier.stop()
+        await tenant.ban_expiry.stop()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    
+    latencies.sort()
+    report = {
+        "updates": len(records),
+        "elapsed_sec": round(elapsed, 3),
+        "throughput_per_sec": round(len(records) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            name: round(percentile(latencies, fraction) * 1000, 2)
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))
+        },
+        "api_calls": dict(session.calls.most_common()),
+        "api_calls_total": sum(session.calls.values()),
+        "state_writes": state_io_stats["writes"] - io_before["writes"],
+        "state_written_chars": state_io_stats["chars"] - io_before["chars"]
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+# Запуск бота
+async def main(record_path: str = None):
+    tenants.update(create_tenants(load_tenant_configs(), http_session))
+    if record_path:
+        setup_recorder(record_path)
+    
+    for tenant in tenants.values():
+        # Создаем файлы если их нет
+        for filename in [BLOCKED_FILE, POSTS_LOG, USERS_LOG]:
+            path = tenant.path(filename)
+            if not os.path.exists(path):
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump({} if filename != POSTS_LOG else [], f)
+        
+        # Убедимся, что admin_ids содержит реальные ID
+        logger.info("[%s] Администраторы: %s", tenant.name, sorted(tenant.admin_ids))
+        await tenant.post_queue.start()
+        await tenant.scheduler.start()
+        await tenant.notifier.start()
+        await tenant.ban_expiry.start()
+        # Подтверждаем Telegram обработанные до сбоя апдейты, чтобы polling начал со следующего
+        offset = tenant.processed_updates.resume_offset()
+        if offset is not None:
+            try:
+                await tenant.bot.get_updates(offset=offset, limit=1, timeout=0)
+            except Exception as e:
+                logger.error("[%s] Не удалось подтвердить апдейты до %s: %s", tenant.name, offset, e)
+    
+    logger.info("Ботов запущено: %s", len(tenants))
+    config_watcher = ConfigWatcher(TENANTS_FILE, apply_tenant_configs)
+    await config_watcher.start()
+    
+    try:
+        await dp.start_polling(*(tenant.bot for tenant in tenants.values()))
+    finally:
+        await config_watcher.stop()
+        for tenant in tenants.values():
+            await tenant.post_queue.stop()
+            await tenant.scheduler.stop()
+            await tenant.notifier.stop()
+            await tenant.ban_expiry.stop()
+            tenant.reply_index.save_index()
+            tenant.processed_updates.save_state()
+        await http_session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--shards", type=int, default=0,
+        help="Количество процессов-воркеров (0 - все в одном процессе)"
+    )
+    parser.add_argument(
+        "--record", metavar="PATH",
+        help="Записывать обезличенные апдейты в JSONL-трассу (однопроцессный режим)"
+    )
+    parser.add_argument(
+        "--replay", metavar="TRACE", nargs="+",
+        help="Воспроизвести трассу с имитацией Bot API и вывести отчет"
+    )
+    parser.add_argument(
+        "--replay-speed", type=float, default=0.0,
+        help="Темп воспроизведения: 0 - максимально быстро, 1 - как в оригинале"
+    )
+    parser.add_argument(
+        "--replay-latency", type=float, default=0.0,
+        help="Имитируемая задержка каждого вызова Bot API (мс)"
+    )
+    args = parser.parse_args()
+    if args.replay:
+        asyncio.run(run_replay(args.replay, args.replay_speed, args.replay_latency))
+    elif args.shards > 0:
+        asyncio.run(run_front(args.shards))
+    else:
+        asyncio.run(main(args.record))
@@ -0,0 +1,18 @@
+from app import parse_bulk_ids
+
+
+def test_text_list_accepts_whole_integers_only():
+    user_ids, rejected = parse_bulk_ids("123, 456\n789 12ab -5 4.5 123")
+    assert user_ids == [123, 456, 789]
+    assert rejected == ["12ab", "-5", "4.5"]
+
+
+def test_csv_reads_first_column_only():
+    # Число в колонке причины не должно стать ID
+    user_ids, rejected = parse_bulk_ids("user_id,reason\n123,spam 2024\n456,\"a, b\"\n\n", is_csv=True)
+    assert user_ids == [123, 456]
+    assert rejected == ["user_id"]
+
+
+def test_empty_input():
+    assert parse_bulk_ids(" \n,, ") == ([], [])
@@ -0,0 +1,38 @@
+import pytest
+
+from app import validate_tenant_configs
+
+TOKEN = "123456:ABC-def_1"
+
+
+def test_accepts_valid_configs():
+    configs = [
+        {"name": "main", "token": TOKEN, "admin_ids": [1, 2], "rate_limit": 0.5,
+         "channel_id": -1001, "publish_slots": ["09:00", "18:30"], "publish_spacing": 0},
+        {"name": "minimal", "token": "654321:xyz"}
+    ]
+    assert validate_tenant_configs(configs) == {123456: configs[0], 654321: configs[1]}
+
+
+@pytest.mark.parametrize("configs", [
+    {"token": TOKEN},
+    ["not a dict"],
+    [{}],
+    [{"token": "abc:def"}],
+    [{"token": "123456"}],
+    [{"token": TOKEN}, {"token": TOKEN + "x"}],
+    [{"token": TOKEN, "admin_ids": "1,2"}],
+    [{"token": TOKEN, "admin_ids": [1, "2"]}],
+    [{"token": TOKEN, "admin_ids": [True]}],
+    [{"token": TOKEN, "rate_limit": 0}],
+    [{"token": TOKEN, "rate_limit": "25"}],
+    [{"token": TOKEN, "rate_limit": True}],
+    [{"token": TOKEN, "publish_spacing": -1}],
+    [{"token": TOKEN, "channel_id": "-1001"}],
+    [{"token": TOKEN, "publish_slots": "09:00"}],
+    [{"token": TOKEN, "publish_slots": ["25:00"]}],
+    [{"token": TOKEN, "publish_slots": [900]}],
+])
+def test_rejects_invalid_configs(configs):
+    with pytest.raises(ValueError):
+        validate_tenant_configs(configs)
@@ -0,0 +1,22 @@
+import random
+
+from app import AhoCorasick
+
+
+def test_aho_corasick_overlapping_patterns():
+    automaton = AhoCorasick({"he": 1, "she": 2, "his": 3, "hers": 4})
+    assert automaton.search("ushers") == {1, 2, 4}
+    assert automaton.search("ahishe") == {1, 2, 3}
+    assert automaton.search("xyz") == set()
+
+
+def test_aho_corasick_matches_naive_search():
+    rng = random.Random(2)
+    for _ in range(300):
+        patterns = {
+            "".join(rng.choice("abc") for _ in range(rng.randint(1, 5))): index
+            for index in range(rng.randint(1, 8))
+        }
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 40)))
+        expected = {value for pattern, value in patterns.items() if pattern in text}
+        assert AhoCorasick(patterns).search(text) == expected, (patterns, text)
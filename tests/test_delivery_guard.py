@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+
+import app
+from app import DeliveryGuard, DeliveryGuardMiddleware
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_circuit_opens_after_failures_and_closes_after_cooldown(tmp_path, clock):
+    guard = DeliveryGuard(str(tmp_path / "dead_chats.json"), failures=3, cooldown=60)
+    guard.failure(5)
+    guard.failure(5)
+    assert guard.check(5) is None
+    guard.failure(5)
+    assert guard.check(5) == "circuit"
+    assert guard.check(6) is None
+    assert guard.open_circuits() == 1
+    clock[0] += 61
+    assert guard.check(5) is None
+    assert guard.open_circuits() == 0
+
+
+def test_success_resets_failure_count(tmp_path, clock):
+    guard = DeliveryGuard(str(tmp_path / "dead_chats.json"), failures=2, cooldown=60)
+    guard.failure(5)
+    guard.success(5)
+    guard.failure(5)
+    assert guard.check(5) is None
+
+
+def test_dead_chat_is_probed_once_per_interval(tmp_path, clock):
+    filename = str(tmp_path / "dead_chats.json")
+    guard = DeliveryGuard(filename, probe_interval=3600)
+    guard.mark_dead(5, "Forbidden: bot was blocked by the user")
+    assert guard.check(5) == "dead"
+
+    clock[0] += 3601
+    assert guard.check(5) is None  # Проба
+    assert guard.check(5) == "dead"  # Следующая проба - через probe_interval
+    assert guard.stats["probes"] == 1
+
+    # Недоступные чаты переживают перезапуск
+    assert DeliveryGuard(filename).dead_chats.keys() == {"5"}
+    guard.success(5)
+    assert guard.check(5) is None
+    assert DeliveryGuard(filename).dead_chats == {}
+
+
+class FakeAPI:
+    def __init__(self, errors, message="Bad Gateway"):
+        self.errors = list(errors)
+        self.message = message
+        self.calls = 0
+
+    async def __call__(self, bot, method):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)(method, self.message)
+        return True
+
+
+def make_guarded_bot(tmp_path, monkeypatch):
+    bot = SimpleNamespace(id=42)
+    tenant = SimpleNamespace(delivery_guard=DeliveryGuard(str(tmp_path / "dead_chats.json"), failures=1))
+    monkeypatch.setitem(app.tenants, bot.id, tenant)
+    monkeypatch.setattr(app, "TRANSIENT_RETRY_BASE", 0)
+    return bot, tenant.delivery_guard
+
+
+def test_middleware_caches_only_private_dead_chats(tmp_path, monkeypatch):
+    bot, guard = make_guarded_bot(tmp_path, monkeypatch)
+    middleware = DeliveryGuardMiddleware()
+
+    async def scenario():
+        for chat_id in (5, -100):
+            api = FakeAPI([TelegramForbiddenError], "Forbidden: bot was blocked by the user")
+            with pytest.raises(TelegramForbiddenError):
+                await middleware(api, bot, SendMessage(chat_id=chat_id, text="x"))
+
+        # Повторный запрос в личный чат не уходит в Bot API
+        api = FakeAPI([])
+        with pytest.raises(TelegramForbiddenError):
+            await middleware(api, bot, SendMessage(chat_id=5, text="x"))
+        assert api.calls == 0
+        assert await middleware(api, bot, SendMessage(chat_id=-100, text="x")) is True
+
+    asyncio.run(scenario())
+    assert guard.dead_chats.keys() == {"5"}
+
+
+def test_middleware_retries_then_opens_circuit(tmp_path, monkeypatch):
+    bot, guard = make_guarded_bot(tmp_path, monkeypatch)
+    middleware = DeliveryGuardMiddleware()
+
+    async def scenario():
+        api = FakeAPI([TelegramNetworkError] * 2)
+        assert await middleware(api, bot, SendMessage(chat_id=5, text="x")) is True
+        assert api.calls == 3
+
+        api = FakeAPI([TelegramNetworkError] * (app.TRANSIENT_RETRIES + 1))
+        with pytest.raises(TelegramNetworkError):
+            await middleware(api, bot, SendMessage(chat_id=5, text="x"))
+        assert api.calls == app.TRANSIENT_RETRIES + 1
+
+        api = FakeAPI([])
+        with pytest.raises(TelegramNetworkError):
+            await middleware(api, bot, SendMessage(chat_id=5, text="x"))
+        assert api.calls == 0
+
+    asyncio.run(scenario())
+    assert guard.open_circuits() == 1
@@ -0,0 +1,137 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError
+from aiogram.methods import SendMessage
+from aiogram.types import Message, User
+
+import app
+from app import PostLogger, PostQueue, PostStats
+
+
+def make_tenant(tmp_path, admin_ids=(1, 2)):
+    return SimpleNamespace(
+        name="test",
+        admin_ids=frozenset(admin_ids),
+        post_logger=PostLogger(str(tmp_path / "posts_log.json")),
+        post_stats=PostStats(str(tmp_path / "post_stats"))
+    )
+
+
+def make_post(user_id, text):
+    user = User(id=user_id, is_bot=False, first_name=f"u{user_id}")
+    message = Message.model_validate({
+        "message_id": abs(hash(text)) % 100000, "date": 1700000000, "text": text,
+        "chat": {"id": user_id, "type": "private"}, "from": {"id": user_id, "is_bot": False, "first_name": "u"}
+    })
+    return message, user
+
+
+class FakeDelivery:
+    """Заменяет send_post_to_admins: ошибки задаются по тексту поста и админу"""
+
+    def __init__(self, errors):
+        self.errors = errors  # (текст, admin_id) -> список ошибок по попыткам
+        self.delivered = []  # (текст, admin_id) в порядке доставки
+        self.attempts = {}
+
+    async def __call__(self, tenant, message, user, admin_ids=None, tags=None, failed=None):
+        sent = {}
+        for admin_id in admin_ids:
+            key = (message.text, admin_id)
+            attempt = self.attempts[key] = self.attempts.get(key, 0) + 1
+            errors = self.errors.get(key, [])
+            if attempt <= len(errors):
+                failed[admin_id] = errors[attempt - 1]
+                continue
+            self.delivered.append(key)
+            sent[admin_id] = True
+        return sent
+
+
+def network_error():
+    return TelegramNetworkError(SendMessage(chat_id=1, text="x"), "down")
+
+
+@pytest.fixture
+def fast_retry(monkeypatch):
+    monkeypatch.setattr(app, "POST_RETRY_BASE", 0.01)
+    monkeypatch.setattr(app, "POST_RETRY_MAX", 0.05)
+
+
+async def drain(queue, timeout=5):
+    await queue.start()
+    try:
+        async with asyncio.timeout(timeout):
+            while queue.items:
+                await asyncio.sleep(0.01)
+    finally:
+        await queue.stop()
+
+
+def test_transient_failure_is_retried_and_keeps_user_order(tmp_path, monkeypatch, fast_retry):
+    # Первый пост пользователя 10 дважды не доходит до админа 1
+    delivery = FakeDelivery({("a1", 1): [network_error(), network_error()]})
+    monkeypatch.setattr(app, "send_post_to_admins", delivery)
+
+    async def main():
+        queue = PostQueue(str(tmp_path / "queue"), make_tenant(tmp_path))
+        for user_id, text in ((10, "a1"), (10, "a2"), (20, "b1")):
+            queue.put(*make_post(user_id, text))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert delivery.attempts[("a1", 1)] == 3
+    to_admin1 = [text for text, admin_id in delivery.delivered if admin_id == 1]
+    # Второй пост ждет повтора первого, посты другого пользователя - нет
+    assert to_admin1.index("a1") < to_admin1.index("a2")
+    assert to_admin1.index("b1") < to_admin1.index("a1")
+    assert not os.listdir(tmp_path / "queue")
+
+
+def test_many_transient_failures_do_not_drop_post(tmp_path, monkeypatch, fast_retry):
+    delivery = FakeDelivery({("a1", 1): [network_error()] * 15})
+    monkeypatch.setattr(app, "send_post_to_admins", delivery)
+
+    async def main():
+        queue = PostQueue(str(tmp_path / "queue"), make_tenant(tmp_path, admin_ids=[1]))
+        queue.put(*make_post(10, "a1"))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert delivery.delivered == [("a1", 1)]
+
+
+def test_permanent_failure_drops_only_that_admin(tmp_path, monkeypatch, fast_retry):
+    forbidden = TelegramForbiddenError(SendMessage(chat_id=2, text="x"), "bot was blocked by the user")
+    delivery = FakeDelivery({("a1", 2): [forbidden]})
+    monkeypatch.setattr(app, "send_post_to_admins", delivery)
+
+    async def main():
+        queue = PostQueue(str(tmp_path / "queue"), make_tenant(tmp_path))
+        queue.put(*make_post(10, "a1"))
+        await drain(queue)
+
+    asyncio.run(main())
+    assert delivery.delivered == [("a1", 1)]
+    assert delivery.attempts[("a1", 2)] == 1
+
+
+def test_queue_survives_restart_in_order(tmp_path, monkeypatch):
+    delivery = FakeDelivery({})
+    monkeypatch.setattr(app, "send_post_to_admins", delivery)
+    tenant = make_tenant(tmp_path, admin_ids=[1])
+
+    async def main():
+        queue = PostQueue(str(tmp_path / "queue"), tenant, limit=2)
+        delayed = [queue.put(*make_post(10, text)) for text in ("a1", "a2", "a3")]
+        assert delayed == [False, False, True]
+        # Воркеры не запускались: посты остались только на диске
+        restored = PostQueue(str(tmp_path / "queue"), tenant)
+        assert len(restored.items) == 3
+        await drain(restored)
+
+    asyncio.run(main())
+    assert [text for text, _ in delivery.delivered] == ["a1", "a2", "a3"]
@@ -0,0 +1,52 @@
+import random
+from collections import Counter
+
+from app import PostStats
+
+
+def brute_force(rows, since):
+    window = [row for row in rows if row[1] >= since]
+    return {
+        "senders": Counter(row[0] for row in window),
+        "media": Counter(row[2] for row in window),
+        "length_sum": sum(row[3] for row in window),
+        "max_length": max((row[3] for row in window), default=0),
+        "posts": len(window)
+    }
+
+
+def test_post_stats_aggregate_matches_brute_force(tmp_path):
+    rng = random.Random(3)
+    stats = PostStats(str(tmp_path / "post_stats"))
+    rows = []
+    ts = 1_700_000_000
+    since = ts
+    for step in range(400):
+        for _ in range(rng.randint(0, 5)):
+            ts += rng.randint(0, 600)
+            media = rng.choice(PostStats.MEDIA_TYPES)
+            row = (rng.randint(1, 20), ts, PostStats.MEDIA_TYPES.index(media), rng.randint(0, 500))
+            stats.add(row[0], row[1], media, row[3])
+            rows.append(row)
+        # Окно в основном сдвигается вперед, иногда назад (агрегаты пересчитываются с нуля)
+        since = since - rng.randint(0, 20000) if step % 50 == 0 else since + rng.randint(0, 1500)
+        agg = stats.aggregate(since)
+        expected = brute_force(rows, since)
+        assert agg["hi"] - agg["lo"] == expected["posts"]
+        assert +agg["senders"] == expected["senders"]
+        assert +agg["media"] == expected["media"]
+        assert agg["length_sum"] == expected["length_sum"]
+        assert agg["max_length"] == expected["max_length"]
+
+
+def test_post_stats_reload_drops_torn_row(tmp_path):
+    filename = str(tmp_path / "post_stats")
+    stats = PostStats(filename)
+    stats.add(1, 100, "text", 5)
+    stats.add(2, 200, "photo", 0)
+    # Сбой посреди записи: в одной колонке оказалась лишняя строка
+    with open(f"{filename}.user_id", "ab") as f:
+        f.write(stats.user_id[-1:].tobytes())
+    reloaded = PostStats(filename)
+    assert list(reloaded.user_id) == [1, 2]
+    assert reloaded.summary(0) == {"posts": 2, "senders": 2, "avg_length": 2.5, "max_length": 5}
@@ -0,0 +1,28 @@
+import asyncio
+
+from aiogram.methods import AnswerCallbackQuery, CopyMessage, GetUpdates, SendMessage
+from aiogram.types import Message, MessageId
+
+from app import ReplaySession
+
+
+def test_replay_session_returns_api_result_types():
+    session = ReplaySession()
+
+    async def main():
+        return [
+            await session.make_request(None, method) for method in (
+                CopyMessage(chat_id=1, from_chat_id=2, message_id=3),
+                SendMessage(chat_id=1, text="text"),
+                GetUpdates(),
+                AnswerCallbackQuery(callback_query_id="1")
+            )
+        ]
+
+    copied, sent, updates, answered = asyncio.run(main())
+    # Задержанный медиапост берет message_id копии для кнопок
+    assert isinstance(copied, MessageId)
+    assert isinstance(sent, Message) and sent.chat.id == 1
+    assert updates == []
+    assert answered is True
+    assert session.calls["CopyMessage"] == 1
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import app
+from app import ReplyIndex
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(app, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def run(func):
+    # put() откладывает сохранение через call_later, поэтому нужен работающий цикл
+    async def scenario():
+        return func()
+    return asyncio.run(scenario())
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path, clock):
+    def scenario():
+        index = ReplyIndex(str(tmp_path / "reply_index.json"), max_size=2, ttl=3600)
+        index.put(1, 10, 100)
+        index.put(1, 11, 101)
+        assert index.get(1, 10) == 100  # 10 становится самой свежей
+        index.put(1, 12, 102)
+        index.save_index()
+        return index
+
+    index = run(scenario)
+    assert index.get(1, 11) is None
+    assert index.get(1, 10) == 100
+    assert index.get(1, 12) == 102
+
+
+def test_ttl_expiry(tmp_path, clock):
+    def scenario():
+        index = ReplyIndex(str(tmp_path / "reply_index.json"), max_size=10, ttl=60)
+        index.put(1, 10, 100)
+        clock[0] += 30
+        index.put(1, 11, 101)
+        clock[0] += 31
+        assert index.get(1, 10) is None
+        assert index.get(1, 11) == 101
+        clock[0] += 30
+        # Устаревшие записи в начале вытесняются при добавлении
+        index.put(1, 12, 102)
+        assert list(index.entries) == ["1:12"]
+        index.save_index()
+
+    run(scenario)
+
+
+def test_saves_once_and_reloads(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(app, "REPLY_INDEX_SAVE_DELAY", 0)
+    filename = str(tmp_path / "reply_index.json")
+
+    async def scenario():
+        index = ReplyIndex(filename, max_size=10, ttl=3600)
+        saved = []
+        index.save_index = lambda original=index.save_index: (saved.append(1), original())
+        index.put(-5, 1, 100)
+        index.put(-5, 2, 200)
+        await asyncio.sleep(0.01)
+        # Серия добавлений записывается один раз
+        assert saved == [1]
+
+    asyncio.run(scenario())
+    reloaded = ReplyIndex(filename, max_size=10, ttl=3600)
+    assert reloaded.get(-5, 1) == 100
+    assert reloaded.get(-5, 2) == 200
+    assert reloaded.get(-5, 3) is None
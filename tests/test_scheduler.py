@@ -0,0 +1,87 @@
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app import PublicationScheduler
+
+
+class FakeBot:
+    def __init__(self, fail=0):
+        self.fail = fail
+        self.copied = []
+
+    async def copy_message(self, chat_id, from_chat_id, message_id):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("network")
+        self.copied.append((chat_id, from_chat_id, message_id))
+
+
+def make_tenant(slots=(), spacing=600, bot=None):
+    return SimpleNamespace(name="test", publish_slots=list(slots), publish_spacing=spacing,
+                           bot=bot or FakeBot(), channel_id=-100)
+
+
+def test_spacing_between_posts(tmp_path):
+    scheduler = PublicationScheduler(str(tmp_path / "schedule.json"), make_tenant(spacing=600))
+    first = scheduler.schedule(1, 10)
+    second = scheduler.schedule(1, 11)
+    assert first >= time.time() - 1
+    assert second - first == 600
+    # Время раньше свободного слота сдвигается, позднее сохраняется
+    assert scheduler.schedule(1, 12, publish_at=first) == second + 600
+    assert scheduler.schedule(1, 13, publish_at=second + 7200) == second + 7200
+
+
+def test_duplicate_and_cancel(tmp_path):
+    scheduler = PublicationScheduler(str(tmp_path / "schedule.json"), make_tenant())
+    assert scheduler.schedule(1, 10) is not None
+    assert scheduler.schedule(1, 10) is None
+    assert scheduler.cancel(1, 10) is True
+    assert scheduler.cancel(1, 10) is False
+
+
+def test_fixed_slots(tmp_path):
+    scheduler = PublicationScheduler(str(tmp_path / "schedule.json"), make_tenant(slots=["18:00", "09:00"]))
+    upcoming = scheduler.upcoming_slots(3)
+    # upcoming_slots не занимает слоты
+    assert scheduler.upcoming_slots(3) == upcoming
+    assert [scheduler.schedule(1, n) for n in range(3)] == upcoming
+    assert upcoming == sorted(set(upcoming))
+    for slot in upcoming:
+        assert datetime.fromtimestamp(slot).strftime("%H:%M") in ("09:00", "18:00")
+    assert 23 * 3600 <= upcoming[2] - upcoming[0] <= 25 * 3600
+
+
+def test_schedule_survives_restart(tmp_path):
+    filename = str(tmp_path / "schedule.json")
+    first = PublicationScheduler(filename, make_tenant())
+    publish_at = first.schedule(1, 10)
+    second = PublicationScheduler(filename, make_tenant())
+    assert second.entries["1_10"]["publish_at"] == publish_at
+    assert second.schedule(1, 10) is None
+    assert second.schedule(1, 11) == publish_at + 600
+
+
+def test_publishes_due_posts_and_retries(tmp_path):
+    async def scenario():
+        bot = FakeBot(fail=1)
+        scheduler = PublicationScheduler(str(tmp_path / "schedule.json"), make_tenant(spacing=0, bot=bot))
+        await scheduler.start()
+        scheduler.schedule(1, 10)
+        await asyncio.sleep(0.05)
+        # Первая попытка не удалась - повтор отложен
+        assert bot.copied == []
+        assert scheduler.entries["1_10"]["attempts"] == 1
+        assert scheduler.entries["1_10"]["publish_at"] > time.time()
+
+        scheduler.entries["1_10"]["publish_at"] = time.time()
+        scheduler._push(scheduler.entries["1_10"]["publish_at"], "1_10")
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        assert bot.copied == [(-100, 1, 10)]
+        assert scheduler.entries == {}
+        assert scheduler.schedule(1, 10) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,81 @@
+import asyncio
+
+from app import KeyedSerialExecutor
+
+
+def test_same_key_runs_in_arrival_order():
+    async def scenario():
+        executor = KeyedSerialExecutor(concurrency=4)
+        order = []
+
+        def job(key, n, delay):
+            async def func():
+                order.append((key, n, "start"))
+                await asyncio.sleep(delay)
+                order.append((key, n, "end"))
+                return n
+            return func
+
+        # Первый апдейт ключа самый медленный - следующие не должны его обогнать
+        results = await asyncio.gather(
+            executor.run("a", job("a", 1, 0.05)),
+            executor.run("a", job("a", 2, 0)),
+            executor.run("a", job("a", 3, 0.01))
+        )
+        assert results == [1, 2, 3]
+        assert order == [("a", n, step) for n in (1, 2, 3) for step in ("start", "end")]
+        assert executor.get_stats()["active_keys"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_run_concurrently_within_limit():
+    async def scenario():
+        executor = KeyedSerialExecutor(concurrency=2)
+        running = 0
+        peak = 0
+
+        async def func():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+        await asyncio.gather(*(executor.run(key, func) for key in range(5)))
+        assert peak == 2
+        assert executor.get_stats()["active_keys"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_failure_does_not_block_key():
+    async def scenario():
+        executor = KeyedSerialExecutor(concurrency=1)
+
+        async def fail():
+            raise RuntimeError("boom")
+
+        async def ok():
+            return "ok"
+
+        results = await asyncio.gather(executor.run("a", fail), executor.run("a", ok), return_exceptions=True)
+        assert isinstance(results[0], RuntimeError)
+        assert results[1] == "ok"
+        assert executor.get_stats()["active_keys"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_stats_keep_last_keys_only():
+    async def scenario():
+        executor = KeyedSerialExecutor(concurrency=1, stats_limit=2)
+
+        async def noop():
+            pass
+
+        for key in ("a", "b", "c"):
+            await executor.run(key, noop)
+        assert list(executor.key_stats) == ["b", "c"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import queue
+from types import SimpleNamespace
+
+from aiogram.types import Update
+
+import app
+from app import PRIMARY_SHARD, ReplicatedBlockManager, ShardPeers, ShardRouter, get_shard
+
+BOT_ID = 42
+ADMIN_ID = 7
+
+
+def test_only_writer_saves_and_replicas_converge(tmp_path):
+    filename = str(tmp_path / "blocked_users.json")
+    primary = ReplicatedBlockManager(filename, BOT_ID, queue.Queue(), writer=True)
+    other_outbox = queue.Queue()
+    other = ReplicatedBlockManager(filename, BOT_ID, other_outbox, writer=False)
+
+    other.block_user(5, reason="spam")
+    assert not os.path.exists(filename)
+    kind, bot_id, *payload = other_outbox.get_nowait()
+    assert (kind, bot_id) == ("block", BOT_ID)
+
+    # Фронт рассылает изменение всем воркерам, включая автора
+    primary.apply_replica(kind, *payload)
+    other.apply_replica(kind, *payload)
+    assert ReplicatedBlockManager(filename, BOT_ID, queue.Queue(), writer=False).blocked_users.keys() == {"5"}
+
+    saves = []
+    primary.save_blocked = lambda: saves.append(1)
+    primary.apply_replica(kind, *payload)  # Повтор без изменений не переписывает файл
+    primary.apply_replica("bulk", None, {"block": {}, "unblock": ["5", "6"]})
+    assert saves == [1]
+    assert primary.blocked_users == {}
+
+
+def test_peers_query_owner_and_skip_silent_shards(monkeypatch):
+    monkeypatch.setattr(app, "SHARD_QUERY_TIMEOUT", 0.05)
+    tenant = SimpleNamespace(name="test", bot=SimpleNamespace(id=BOT_ID),
+                             user_manager=SimpleNamespace(users={"5": {"first_name": "local"}}))
+
+    async def scenario():
+        outbox = queue.Queue()
+        peers = ShardPeers(tenant, 0, 3, outbox)
+        # Свой воркер отвечает без фронта
+        assert await peers.query(0, "users", [5, 6]) == {5: {"first_name": "local"}}
+        assert outbox.empty()
+
+        task = asyncio.create_task(peers.query_all("users", [6]))
+        await asyncio.sleep(0.01)
+        sent = [outbox.get_nowait() for _ in range(2)]
+        assert [(kind, target, origin, name) for kind, _, target, origin, _, name, _ in sent] == [
+            ("query", 1, 0, "users"), ("query", 2, 0, "users")
+        ]
+        peers.resolve(sent[0][4], {6: {"first_name": "remote"}})  # Воркер 2 не ответил
+        assert await task == [{}, {6: {"first_name": "remote"}}]
+        assert peers._requests == {}
+
+    asyncio.run(scenario())
+
+
+def make_update(user_id, data=None):
+    sender = {"id": user_id, "is_bot": False, "first_name": "u"}
+    if data is None:
+        return Update.model_validate({"update_id": 1, "message": {
+            "message_id": 1, "date": 1700000000, "text": "hi",
+            "chat": {"id": user_id, "type": "private"}, "from": sender
+        }})
+    return Update.model_validate({"update_id": 1, "callback_query": {
+        "id": "1", "from": sender, "chat_instance": "1", "data": data
+    }})
+
+
+def test_router_sends_moderation_to_primary_and_held_posts_to_author():
+    shards = 4
+    router = ShardRouter(shards, {BOT_ID: frozenset([ADMIN_ID])}, {BOT_ID: None})
+    for user_id in range(100, 110):
+        owner = get_shard(BOT_ID, user_id, shards)
+        assert router.route(BOT_ID, make_update(user_id)) == owner
+        assert router.route(BOT_ID, make_update(ADMIN_ID, f"held_release_{user_id}_1")) == owner
+        for data in (f"pub_approve_{user_id}_1", f"pub_at_{user_id}_1_1700000000"):
+            assert router.route(BOT_ID, make_update(ADMIN_ID, data)) == PRIMARY_SHARD
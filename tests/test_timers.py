@@ -0,0 +1,89 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import BanExpiryScheduler, BlockManager, HeapTimer, parse_duration
+
+
+class RecordingTimer(HeapTimer):
+    def __init__(self):
+        super().__init__()
+        self.due = {}
+        self.fired = []
+
+    def add(self, key, delay):
+        self.due[key] = time.time() + delay
+        self._push(self.due[key], key)
+
+    def _due(self, key):
+        return self.due.get(key)
+
+    async def _fire(self, key):
+        del self.due[key]
+        self.fired.append(key)
+
+
+def test_heap_timer_is_abstract():
+    with pytest.raises(TypeError):
+        HeapTimer()
+
+
+def test_heap_timer_fires_in_due_order_and_skips_stale_entries():
+    async def scenario():
+        timer = RecordingTimer()
+        await timer.start()
+        timer.add("late", 0.06)
+        timer.add("early", 0.02)  # Раньше текущего ожидания - таймер должен проснуться
+        timer.add("cancelled", 0.01)
+        del timer.due["cancelled"]
+        timer.add("moved", 0.01)
+        timer.add("moved", 0.04)  # Перенос: старая запись в куче устарела
+        await asyncio.sleep(0.15)
+        await timer.stop()
+        assert timer.fired == ["early", "moved", "late"]
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("text, seconds", [
+    ("30m", 1800), ("12ч", 43200), ("7 d", 604800), ("2Н", 1209600)
+])
+def test_parse_duration(text, seconds):
+    assert parse_duration(text) == seconds
+
+
+@pytest.mark.parametrize("text", ["", "0d", "d", "10", "5y", "1.5h", "-1d", "спам"])
+def test_parse_duration_rejects(text):
+    assert parse_duration(text) is None
+
+
+def test_ban_expiry_unblocks_and_notifies(tmp_path):
+    async def scenario():
+        notified = []
+        tenant = SimpleNamespace(
+            name="test",
+            block_manager=BlockManager(str(tmp_path / "blocked_users.json")),
+            notifier=SimpleNamespace(notify=lambda user_id, text: notified.append(user_id))
+        )
+        tenant.block_manager.block_user(1, duration=60)
+        scheduler = BanExpiryScheduler(tenant)
+        await scheduler.start()
+        tenant.block_manager.block_user(2)  # Навсегда
+        tenant.block_manager.block_user(3, duration=60)
+        tenant.block_manager.unblock_user(3)  # Снята вручную до срока
+
+        # Сдвигаем срок в прошлое и учитываем заново
+        for user_id_str in ("1", "3"):
+            data = tenant.block_manager.blocked_users.get(user_id_str)
+            if data:
+                data["expires_at"] = (datetime.now() - timedelta(seconds=1)).isoformat()
+                scheduler.track(user_id_str, data)
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        assert set(tenant.block_manager.blocked_users) == {"2"}
+        assert notified == [1]
+
+    asyncio.run(scenario())
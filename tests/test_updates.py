@@ -0,0 +1,74 @@
+import asyncio
+import random
+
+from app import UpdateDeduplicator
+
+
+def run_dedup(filename, window, steps):
+    """Выполняет steps над дедупликатором внутри цикла событий (сохранение идет через call_soon)"""
+    async def main():
+        dedup = UpdateDeduplicator(filename, window)
+        result = steps(dedup)
+        await asyncio.sleep(0)
+        return dedup, result
+    return asyncio.run(main())
+
+
+def process(dedup, update_id):
+    if not dedup.begin(update_id):
+        return False
+    dedup.finish(update_id)
+    return True
+
+
+def test_dedup_rejects_repeats_and_concurrent(tmp_path):
+    def steps(dedup):
+        assert dedup.begin(100)
+        assert not dedup.begin(100)  # Тот же апдейт еще обрабатывается
+        dedup.finish(100)
+        assert not dedup.begin(100)
+        assert process(dedup, 99)  # Пропущенный апдейт внутри окна
+        assert not process(dedup, 99)
+    dedup, _ = run_dedup(str(tmp_path / "state.json"), 16, steps)
+    assert dedup.duplicates == 3
+    assert dedup.resume_offset() == 101
+
+
+def test_dedup_window_slides(tmp_path):
+    def steps(dedup):
+        assert process(dedup, 10)
+        assert process(dedup, 30)
+        # Старше окна - считается обработанным, внутри окна - нет
+        assert not process(dedup, 14)
+        assert process(dedup, 15)
+        # Биты, оставшиеся от 10 (тот же бит, что и у 26), очищены при сдвиге
+        assert process(dedup, 26)
+    run_dedup(str(tmp_path / "state.json"), 16, steps)
+
+
+def test_dedup_matches_reference_set(tmp_path):
+    window = 64
+    rng = random.Random(1)
+
+    def steps(dedup):
+        seen = set()
+        high = -1
+        for _ in range(5000):
+            update_id = max(0, high + rng.randint(-window - 10, 20))
+            expected = update_id not in seen and update_id > high - window
+            assert process(dedup, update_id) == expected, update_id
+            if expected:
+                seen.add(update_id)
+                high = max(high, update_id)
+    run_dedup(str(tmp_path / "state.json"), window, steps)
+
+
+def test_dedup_state_survives_restart(tmp_path):
+    filename = str(tmp_path / "state.json")
+    run_dedup(filename, 16, lambda dedup: [process(dedup, update_id) for update_id in (5, 7, 8)])
+
+    def steps(dedup):
+        assert dedup.resume_offset() == 9
+        assert not process(dedup, 7)
+        assert process(dedup, 6)
+    run_dedup(filename, 16, steps)